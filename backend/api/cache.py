@@ -0,0 +1,229 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Thread-safe in-memory LRU cache whose entries also expire after
+    `ttl` seconds. `max_entries` bounds its size; the least recently used
+    entry is evicted first.
+    """
+
+    def __init__(self, max_entries=1024, ttl=900):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            return None if entry is None else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class SQLiteStore:
+    """
+    JSON key/value store in a SQLite file, shared by every uvicorn worker
+    pointed at the same path. Entries expire after `ttl` seconds and the
+    least recently used rows are pruned beyond `max_entries`.
+
+    Reads do not write. A hit only records a new use time when the stored
+    one is more than TOUCH_FRACTION of the TTL old, and those touches are
+    written in batches of TOUCH_BATCH or with the next set(), so readers
+    in different workers do not queue on the write lock.
+    """
+
+    TOUCH_FRACTION = 0.1
+    TOUCH_BATCH = 64
+
+    def __init__(self, path, max_entries=100000, ttl=900):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._touched = {}  # key -> use time not yet written
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL, used_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, used_at FROM cache WHERE key = ? AND expires_at >= ?",
+                (key, now),
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] >= self.ttl * self.TOUCH_FRACTION:
+                self._touched[key] = now
+                if len(self._touched) >= self.TOUCH_BATCH:
+                    self._write_touches()
+                    self._conn.commit()
+        return json.loads(row[0])
+
+    def _write_touches(self):
+        # Caller holds the lock and commits
+        self._conn.executemany(
+            "UPDATE cache SET used_at = MAX(used_at, ?) WHERE key = ?",
+            [(used_at, key) for key, used_at in self._touched.items()],
+        )
+        self._touched.clear()
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._touched.pop(key, None)
+            self._write_touches()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, used_at)"
+                " VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + self.ttl, now),
+            )
+            self._conn.execute("DELETE FROM cache WHERE expires_at < ?", (now,))
+            self._conn.execute(
+                "DELETE FROM cache WHERE key IN ("
+                " SELECT key FROM cache ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._touched.clear()
+            self._conn.execute("DELETE FROM cache")
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+class PredictionCache:
+    """
+    Caches ML rankings by (graph structure, source, target). The picks
+    depend on nothing else, so a player resubmitting the same graph with
+    different firewalls skips feature extraction and the model entirely.
+
+    Lookups go to the in-process LRU first, then to the optional shared
+    SQLite store so that several workers can reuse each other's results.
+
+    Keys include `model_version`, so rankings from another model are
+    never served. Loading a model only switches the version; it does not
+    wipe the shared store that other workers are still using.
+    """
+
+    def __init__(self, max_entries=1024, ttl=900, shared_path=None):
+        self.memory = TTLCache(max_entries=max_entries, ttl=ttl)
+        self.shared = SQLiteStore(shared_path, ttl=ttl) if shared_path else None
+        self.shared_hits = 0
+        self.model_version = None
+
+    def set_model_version(self, version):
+        if version != self.model_version:
+            self.model_version = version
+            # Entries for the old version can no longer be hit
+            self.memory.clear()
+
+    def key(self, graph, source, target):
+        return f"{self.model_version}:{graph.fingerprint()}:{source}:{target}"
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is None and self.shared is not None:
+            value = self.shared.get(key)
+            if value is not None:
+                self.shared_hits += 1
+                self.memory.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        if self.shared is not None:
+            self.shared.set(key, value)
+
+    def clear(self):
+        self.memory.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def stats(self):
+        stats = self.memory.stats()
+        # Memory misses answered by the shared store are not real misses
+        stats["misses"] -= self.shared_hits
+        stats["shared_hits"] = self.shared_hits
+        stats["backend"] = "sqlite" if self.shared is not None else "memory"
+        stats["model_version"] = self.model_version
+        if self.shared is not None:
+            stats["shared_size"] = len(self.shared)
+        lookups = stats["hits"] + stats["shared_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["shared_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+def prediction_cache_from_env():
+    """Builds the prediction cache from PREDICTION_CACHE_* settings."""
+    backend = os.getenv("PREDICTION_CACHE_BACKEND", "memory")
+    shared_path = None
+    if backend == "sqlite":
+        shared_path = os.getenv("PREDICTION_CACHE_PATH", "prediction_cache.sqlite3")
+    return PredictionCache(
+        max_entries=int(os.getenv("PREDICTION_CACHE_SIZE", 1024)),
+        ttl=float(os.getenv("PREDICTION_CACHE_TTL", 900)),
+        shared_path=shared_path,
+    )
@@ -0,0 +1,251 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+import signal
+import threading
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+
+from fastapi import HTTPException
+
+from core.metrics.timing import replay, run_collecting, stage
+
+
+def _init_worker(pids):
+    """
+    Process pool initializer: reports the worker's PID, so a stuck pool
+    can be killed, then loads the worker's own copy of the model.
+    """
+    pids.put(os.getpid())
+    from api.routes.ml import load_model
+    load_model()
+
+
+def shared_model_pages():
+    """True when process workers share the model's pages (forest arrays, mmap)."""
+    return os.getenv("MODEL_FORMAT", "pickle") == "forest" and os.getenv("MODEL_MMAP", "0") == "1"
+
+
+class CPUExecutor:
+    """
+    Runs CPU-bound work (feature extraction, prediction, simulation) off
+    the event loop, so cheap endpoints stay responsive while big graphs
+    are being processed.
+
+    `kind` is "process" (a spawn-based process pool, which sidesteps the
+    GIL) or "thread". Every process worker loads its own copy of the
+    model, so the service holds workers + 1 copies. Only with
+    MODEL_FORMAT=forest and MODEL_MMAP=1 do those copies share their
+    pages; with the pickle each one is private memory, and starting the
+    pool warns about it.
+
+    At most `workers` jobs run at once and `queue_limit` more may wait;
+    beyond that run() raises a 429. A job not done within its timeout
+    raises a 504 and gives its slot back: a queued job is cancelled, a
+    running one is abandoned. Threads cannot be stopped, but once every
+    process worker is stuck on an abandoned job the process pool is
+    replaced, so timeouts cannot wedge it.
+    """
+
+    def __init__(self, kind="process", workers=None, queue_limit=32, timeout=30.0):
+        if kind not in ("process", "thread"):
+            raise ValueError(f"Unknown executor kind: {kind}")
+        self.kind = kind
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.queue_limit = queue_limit
+        self.timeout = timeout
+        self._pool = None
+        self._lock = threading.Lock()
+        self._abandoned = {}  # Running job whose caller timed out -> its pool
+        self._worker_pids = {}  # Process pool -> queue its workers report PIDs on
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.recycled = 0
+
+    def _get_pool(self):
+        if self._pool is None:
+            if self.kind == "process":
+                if not shared_model_pages():
+                    print(
+                        "⚠️ Each process worker holds a private copy of the model; set"
+                        " MODEL_FORMAT=forest and MODEL_MMAP=1 to share it, or"
+                        " EXECUTOR_KIND=thread to keep a single copy"
+                    )
+                context = multiprocessing.get_context("spawn")
+                pids = context.SimpleQueue()
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=context,
+                    initializer=_init_worker,
+                    initargs=(pids,),
+                )
+                self._worker_pids[self._pool] = pids
+            else:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="cpu-worker"
+                )
+        return self._pool
+
+    def _busy(self):
+        self.rejected += 1
+        return HTTPException(
+            status_code=429,
+            detail="Server is busy, try again shortly",
+            headers={"Retry-After": "1"},
+        )
+
+    def _admit(self):
+        with self._lock:
+            if self.in_flight >= self.workers + self.queue_limit:
+                raise self._busy()
+            self.in_flight += 1
+
+    def _release(self, future):
+        with self._lock:
+            if future in self._abandoned:
+                # Its slot was given back when it timed out
+                del self._abandoned[future]
+            else:
+                self.in_flight -= 1
+            self.completed += 1
+
+    def _abandon(self, future, pool):
+        """Gives back the slot of a job whose caller timed out."""
+        if future.cancel():
+            return  # Never started; _release already ran
+        with self._lock:
+            if future.done():
+                return  # Finished meanwhile; its callback frees the slot
+            self._abandoned[future] = pool
+            self.in_flight -= 1
+            stuck = sum(owner is pool for owner in self._abandoned.values())
+        if self.kind == "process" and stuck >= self.workers:
+            self._recycle(pool)
+
+    def _recycle(self, pool):
+        """
+        Replaces a process pool whose workers are all stuck on abandoned
+        jobs. The old workers are killed; jobs still queued on it fail
+        with a 503.
+        """
+        with self._lock:
+            if self._pool is not pool:
+                return  # Already replaced
+            self._pool = None
+            self.recycled += 1
+            pids = self._worker_pids.pop(pool)
+        pool.shutdown(wait=False, cancel_futures=True)
+        # Every worker reported its PID when it started, so this kills
+        # exactly the old pool's workers; the next job starts a new pool
+        while not pids.empty():
+            try:
+                os.kill(pids.get(), signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        pids.close()
+
+    def reserve(self):
+        """
+        Takes a slot for CPU work that has to run in this process (it
+        uses session state, or is streamed), so it still counts toward
+        the 429 limit; raises the 429 when there is none. Such work gets
+        no timeout. Returns the function that gives the slot back, which
+        does nothing when called again.
+        """
+        self._admit()
+        released = []
+
+        def release():
+            with self._lock:
+                if released:
+                    return
+                released.append(True)
+                self.in_flight -= 1
+                self.completed += 1
+
+        return release
+
+    @contextmanager
+    def reserved(self):
+        """reserve() for the duration of a with block."""
+        release = self.reserve()
+        try:
+            yield
+        finally:
+            release()
+
+    async def run(self, fn, *args, timeout=None, **kwargs):
+        """Runs fn(*args, **kwargs) on the pool and awaits its result."""
+        self._admit()
+
+        try:
+            pool = self._get_pool()
+            # Stage timings made on the worker come back with the result
+            future = pool.submit(functools.partial(run_collecting, fn, *args, **kwargs))
+        except BaseException:
+            self._release(None)
+            raise
+        # The slot is freed when the job really ends, not when we stop waiting
+        future.add_done_callback(self._release)
+
+        waiter = asyncio.wrap_future(future)
+        # Nobody reads the outcome of an abandoned job
+        waiter.add_done_callback(lambda done: done.cancelled() or done.exception())
+        # asyncio.wait, unlike wait_for, leaves the job alone on timeout;
+        # _abandon decides what happens to it
+        with stage("executor"):
+            await asyncio.wait([waiter], timeout=timeout or self.timeout)
+        if not waiter.done():
+            with self._lock:
+                self.timeouts += 1
+            self._abandon(future, pool)
+            raise HTTPException(status_code=504, detail="Request timed out")
+        if waiter.cancelled() or isinstance(waiter.exception(), BrokenExecutor):
+            raise HTTPException(
+                status_code=503, detail="Worker pool was restarted, try again",
+                headers={"Retry-After": "1"},
+            )
+        result, observations = waiter.result()
+        replay(observations)
+        return result
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._worker_pids.pop(self._pool, None)
+            self._pool = None
+
+    def stats(self):
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "queue_limit": self.queue_limit,
+            "timeout_seconds": self.timeout,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "abandoned": len(self._abandoned),
+            "recycled": self.recycled,
+            # Model copies held outside shared pages, besides the server's own
+            "private_model_copies": (
+                self.workers if self.kind == "process" and not shared_model_pages() else 0
+            ),
+        }
+
+
+def cpu_executor_from_env():
+    """Builds the executor from EXECUTOR_* settings."""
+    workers = os.getenv("EXECUTOR_WORKERS")
+    return CPUExecutor(
+        kind=os.getenv("EXECUTOR_KIND", "process"),
+        workers=int(workers) if workers else None,
+        queue_limit=int(os.getenv("EXECUTOR_QUEUE_LIMIT", 32)),
+        timeout=float(os.getenv("EXECUTOR_TIMEOUT", 30)),
+    )
+
+
+EXECUTOR = cpu_executor_from_env()
@@ -1,15 +1,30 @@
 # backend/api/main.py
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 import os
 
+from api.executor import EXECUTOR
+from api.metrics import MetricsMiddleware, render_metrics
 from api.routes import game, ml  # existing imports
-from api.routes.ml import load_model
+from api.routes.ml import load_model, start_model_loading
+from core.graph.csr import GraphFormatError
 
-app = FastAPI(title="Network Flow Defence API")
 
-# Load ML model on startup
-load_model()
+@asynccontextmanager
+async def lifespan(app):
+    # Load ML model on startup. By default this happens in the background
+    # so "/" answers straight away; /ml/ready reports when it is done.
+    if os.getenv("MODEL_EAGER_LOAD", "0") == "1":
+        load_model()
+    else:
+        start_model_loading()
+    yield
+    EXECUTOR.shutdown()
+
+
+app = FastAPI(title="Network Flow Defence API", lifespan=lifespan)
 
 # ✅ Allow CORS for frontend (during Render deployment)
 FRONTEND_ORIGIN = os.getenv("FRONTEND_ORIGIN", "*")
@@ -22,6 +37,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route request counts and latency, per-stage timings, Server-Timing
+app.add_middleware(MetricsMiddleware)
+
+# A malformed graph payload is the client's error, wherever it is parsed
+# (including on an executor worker)
+@app.exception_handler(GraphFormatError)
+async def graph_format_error(request, exc):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
 # ✅ Include routers
 app.include_router(game.router, prefix="/game")
 app.include_router(ml.router, prefix="/ml")
@@ -31,6 +55,18 @@ def root():
     return {"status": "Server is live on Render!"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus-style metrics: stage/request histograms, graph sizes, cache and executor."""
+    return render_metrics(ml.PREDICTION_CACHE.stats(), EXECUTOR.stats())
+
+
+@app.get("/executor/stats")
+def executor_stats():
+    """Queue depth, rejections (429) and timeouts of the CPU executor."""
+    return EXECUTOR.stats()
+
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
@@ -0,0 +1,81 @@
+import os
+import time
+
+from core.metrics.timing import REGISTRY, collect, flush, server_timing
+
+# Send a Server-Timing header on every response, not just on requests
+# that ask for it with an "X-Server-Timing: 1" header
+SERVER_TIMING_ALWAYS = os.getenv("SERVER_TIMING", "0") == "1"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that counts requests, times them per route and
+    collects the pipeline stage timings made while serving them (see
+    core/metrics/timing.py). Everything is recorded once the response
+    is finished, and a Server-Timing header is added when asked for.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers", []))
+        want_timing = SERVER_TIMING_ALWAYS or headers.get(b"x-server-timing") == b"1"
+        status = 500
+        start = time.perf_counter()
+
+        with collect() as collected:
+            async def send_with_timing(message):
+                nonlocal status
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                    if want_timing:
+                        total = f"total;dur={(time.perf_counter() - start) * 1000:.3f}"
+                        stages = server_timing(collected)
+                        value = f"{stages}, {total}" if stages else total
+                        message["headers"] = list(message.get("headers", [])) + [
+                            (b"server-timing", value.encode())
+                        ]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_timing)
+            finally:
+                labels = (("method", scope["method"]), ("route", _route_template(scope)))
+                REGISTRY.increment("requests_total", labels + (("status", str(status)),))
+                REGISTRY.observe("request_seconds", labels, time.perf_counter() - start)
+                flush(collected)
+
+
+def _route_template(scope):
+    """
+    The matched path with its parameters put back as {name}, so ids such
+    as game_id stay out of the labels.
+    """
+    if scope.get("route") is None:
+        return "unmatched"
+    parts = scope["path"].split("/")
+    names = {str(value): name for name, value in scope.get("path_params", {}).items()}
+    return "/".join(f"{{{names[part]}}}" if part in names else part for part in parts)
+
+
+def _gauges(prefix, stats):
+    lines = []
+    for key, value in stats.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        name = f"nfd_{prefix}_{key}"
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return lines
+
+
+def render_metrics(cache_stats, executor_stats):
+    """The /metrics body: histograms, counters, then cache and executor gauges."""
+    lines = _gauges("prediction_cache", cache_stats) + _gauges("executor", executor_stats)
+    return REGISTRY.render() + "\n".join(lines) + "\n"
@@ -1,62 +1,383 @@
-from fastapi import APIRouter
+import json
+
+from fastapi import APIRouter, Header
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 
-from core.graph.generation import generate_graph
-from core.infection.simulation import run_bfs_simulation
+from api.executor import EXECUTOR
+from api.sessions import create_session, get_session
+from core.graph.csr import as_csr, node_link_to_compact
+from core.graph.generation import GRAPH_MODELS, generate_graph, generate_large_graph
+from core.graph.mincut import minimum_vertex_cut
+from core.infection.cascade import run_cascade_simulation
+from core.infection.frontier import (
+    evaluate_firewall_sets,
+    pairwise_placements,
+    placement_count,
+    single_node_placements,
+)
+from core.infection.simulation import run_bfs_simulation, stream_bfs_simulation
 from core.scoring.evaluation import calculate_score
 
-# We'll import the ML prediction function later
-from .ml import get_ml_prediction_internal
-
 router = APIRouter()
 
 class SimulationRequest(BaseModel):
+    # Every `graph` field takes node-link JSON or a compact payload
+    # (see CSRGraph.from_compact)
+    graph: Dict[str, Any]
+    source: int
+    target: int
+    firewalled_nodes: List[int]
+
+class WhatIfRequest(BaseModel):
     graph: Dict[str, Any]
     source: int
     target: int
+    firewalled_nodes: List[int] = []  # Firewalls already placed
+    mode: str = "single"  # "single", "pairwise" or "custom"
+    candidate_sets: List[List[int]] = []  # Used when mode is "custom"
+
+class SessionSimulationRequest(BaseModel):
     firewalled_nodes: List[int]
 
+class OptimalDefenseRequest(BaseModel):
+    graph: Dict[str, Any]
+    source: int
+    target: int
+
+class CascadeRequest(BaseModel):
+    graph: Dict[str, Any]
+    sources: List[int]  # Patients zero, all infected at the start
+    targets: List[int] = []  # Protected assets to report on
+    firewalled_nodes: List[int] = []
+    probability: float = 0.1  # Chance an infected node infects a neighbor
+    edge_probabilities: List[Tuple[int, int, float]] = []  # Per-edge overrides
+    runs: int = 1000
+    seed: int = 0
+    max_steps: Optional[int] = None
+
+class SessionCascadeRequest(BaseModel):
+    firewalled_nodes: List[int] = []
+    probability: float = 0.1
+    edge_probabilities: List[Tuple[int, int, float]] = []
+    runs: int = 1000
+    seed: int = 0
+    max_steps: Optional[int] = None
+
+# Cap on the size of generated games (?num_nodes on /new_game)
+MAX_GENERATED_NODES = 200000
+
+# Accept header media types that make /new_game send the graph in a
+# compact encoding instead of node-link JSON
+GRAPH_MEDIA_TYPES = {
+    "application/vnd.graph-edges+json": "edges",
+    "application/vnd.graph-edges-b64+json": "edges_b64",
+}
+
+# Cap on placements scored by one /what_if call
+MAX_WHAT_IF_CANDIDATES = 50000
+
+# Cap on Monte Carlo runs for one /simulate/cascade call
+MAX_CASCADE_RUNS = 100000
+
+
+def _graph_media_type(accept):
+    """The first compact media type listed in an Accept header, if any."""
+    for media_range in (accept or "").split(","):
+        media_type = media_range.split(";")[0].strip()
+        if media_type in GRAPH_MEDIA_TYPES:
+            return media_type
+    return None
+
+
+def new_game_job(num_nodes, model, seed, encoding=None):
+    """generate_large_graph as an executor job, with the graph encoded for the response."""
+    game_data = generate_large_graph(num_nodes, model=model, seed=seed, output="csr")
+    graph = game_data["graph"]
+    game_data["graph"] = graph.to_node_link() if encoding is None else graph.to_compact(encoding)
+    return game_data
+
+
 @router.post("/new_game")
-def get_new_game():
+async def get_new_game(session: bool = False, num_nodes: Optional[int] = None,
+                       model: str = "barabasi_albert", seed: Optional[int] = None,
+                       accept: Optional[str] = Header(None)):
     """
     Generates a new graph, source, and target.
+
+    With ?session=true the game is also kept server-side and a game_id is
+    returned, so follow-up calls only need to send the game_id and picks.
+    With ?num_nodes=N a large sparse network of the given `model` is
+    generated instead of the usual 15-20 node level (for load testing).
+    Sending one of GRAPH_MEDIA_TYPES in Accept returns the graph as a
+    compact payload, which every endpoint also accepts back.
     """
-    game_data = generate_graph()
+    media_type = _graph_media_type(accept)
+    encoding = GRAPH_MEDIA_TYPES.get(media_type)
+    if num_nodes is None:
+        # A 15-20 node level is cheap enough to build on the event loop
+        game_data = generate_graph(seed=seed)
+        if encoding is not None:
+            game_data["graph"] = node_link_to_compact(game_data["graph"], encoding)
+    elif model not in GRAPH_MODELS:
+        return {"error": f"Unknown model: {model}. Choose from {list(GRAPH_MODELS)}"}
+    elif not 3 <= num_nodes <= MAX_GENERATED_NODES:
+        return {"error": f"num_nodes must be between 3 and {MAX_GENERATED_NODES}"}
+    else:
+        game_data = await EXECUTOR.run(new_game_job, num_nodes, model, seed, encoding)
+    if session:
+        game_data["game_id"] = (await run_in_threadpool(create_session, game_data)).game_id
+    if media_type is not None:
+        return JSONResponse(game_data, media_type=media_type)
     return game_data
 
 
-@router.post("/simulate")
-def simulate_infection(request: SimulationRequest):
+def _min_cut_size(graph, source, target):
     """
-    Runs the simulation and returns the result and score.
+    Size of a minimum source-target vertex cut. Adjacent endpoints have
+    none, and only a firewall on an endpoint saves the target; that
+    earns no bonus whatever the size, so 0 stands in.
     """
+    # Dinic solves even the largest generated games in about a second,
+    # far less than the feature extraction ML picks would need
+    return len(minimum_vertex_cut(graph, source, target) or [])
+
+
+def simulate_job(graph_data, source, target, firewalled_nodes):
+    """Parses, simulates and scores as one self-contained executor job."""
+    # Parse the node-link JSON once and share it across every stage
+    graph = as_csr(graph_data)
     # 1. Run the user's simulation
     sim_result = run_bfs_simulation(
-        request.graph,
-        request.source,
-        request.target,
-        request.firewalled_nodes
+        graph,
+        source,
+        target,
+        firewalled_nodes
     )
-    
-    # 2. Get the ML's optimal picks for scoring
-    # (This calls the ML model internally)
-    ml_picks_data = get_ml_prediction_internal(
-        request.graph, 
-        request.source, 
-        request.target, 
-        k=5 # Get top 5 ML picks for comparison
-    )
-    ml_picks = ml_picks_data.get("top_k_nodes", [])
-    
-    # 3. Calculate the score
+
+    # 2. Score optimality against the exact minimum cut size. Every
+    # graph has one, so the ML picks are no longer needed here.
     score_data = calculate_score(
         sim_result["target_status"],
-        request.firewalled_nodes,
-        ml_picks
+        firewalled_nodes,
+        min_cut_size=_min_cut_size(graph, source, target),
+        endpoints=(source, target)
     )
     
     return {
         "simulation": sim_result,
         "scoring": score_data
-    }
\ No newline at end of file
+    }
+
+
+def optimal_defense_job(graph_data, source, target):
+    graph = as_csr(graph_data)
+    if source not in graph.index or target not in graph.index:
+        return {"error": "Source or target is not in the graph"}
+
+    cut = minimum_vertex_cut(graph, source, target)
+    if cut is None:
+        return {"error": "Source and target are adjacent; no firewall set can separate them"}
+    return {"cut_size": len(cut), "cut_nodes": cut}
+
+
+def what_if_job(graph_data, source, target, firewalled_nodes, mode, candidate_sets):
+    graph = as_csr(graph_data)
+
+    # Checked before any placement is built: pairwise on a large graph
+    # would otherwise build millions of lists only to reject them
+    if mode == "single":
+        count = placement_count(graph, source, target, firewalled_nodes)
+    elif mode == "pairwise":
+        count = placement_count(graph, source, target, firewalled_nodes, pairwise=True)
+    elif mode == "custom":
+        count = len(candidate_sets)
+    else:
+        return {"error": f"Unknown mode: {mode}", "results": []}
+
+    if count > MAX_WHAT_IF_CANDIDATES:
+        return {
+            "error": f"Too many placements ({count}), limit is {MAX_WHAT_IF_CANDIDATES}",
+            "results": []
+        }
+
+    if mode == "single":
+        candidates = single_node_placements(graph, source, target, firewalled_nodes)
+    elif mode == "pairwise":
+        candidates = pairwise_placements(graph, source, target, firewalled_nodes)
+    else:
+        candidates = [list(firewalled_nodes) + list(nodes) for nodes in candidate_sets]
+
+    results = evaluate_firewall_sets(graph, source, target, candidates)
+    return {"results": results}
+
+
+@router.post("/simulate")
+async def simulate_infection(request: SimulationRequest):
+    """
+    Runs the simulation and returns the result and score.
+    """
+    return await EXECUTOR.run(
+        simulate_job,
+        request.graph,
+        request.source,
+        request.target,
+        request.firewalled_nodes
+    )
+
+
+@router.post("/sessions/{game_id}/simulate")
+async def simulate_session_infection(game_id: str, request: SessionSimulationRequest):
+    """
+    Same as /simulate, for a game created with /new_game?session=true.
+    Only the firewall picks are sent; the graph is already on the server.
+    """
+    session = get_session(game_id)
+    if session is None:
+        return {"error": "Unknown or expired game_id"}
+
+    return await EXECUTOR.run(
+        simulate_job,
+        session.graph,
+        session.source,
+        session.target,
+        request.firewalled_nodes
+    )
+
+
+def _ndjson_stream(messages):
+    # Starlette iterates sync generators on its threadpool, so each wave
+    # is computed off the event loop as the client reads it. The waves
+    # must be computed here to be streamed, so instead of the executor
+    # the stream holds an executor slot until it ends: a busy server
+    # answers 429 before any header is sent, but a slow reader is not
+    # cut off with a 504.
+    release = EXECUTOR.reserve()
+
+    def lines():
+        try:
+            for message in messages:
+                yield json.dumps(message) + "\n"
+        finally:
+            release()
+
+    # The background task frees the slot if the body is never iterated
+    # (client gone before the first wave); release() only counts once
+    return StreamingResponse(
+        lines(), media_type="application/x-ndjson", background=BackgroundTask(release)
+    )
+
+
+@router.post("/simulate/stream")
+def simulate_infection_stream(request: SimulationRequest, stop_when_decided: bool = False):
+    """
+    Streams the simulation as NDJSON, one infection wave per line, then a
+    "done" line. No scoring; call /simulate for the score.
+    """
+    # Parsed up front so a bad payload fails before the 200 is sent
+    graph = as_csr(request.graph)
+    if request.source not in graph.index:
+        return {"error": "Source is not in the graph"}
+    return _ndjson_stream(stream_bfs_simulation(
+        graph,
+        request.source,
+        request.target,
+        request.firewalled_nodes,
+        stop_when_decided=stop_when_decided
+    ))
+
+
+@router.post("/sessions/{game_id}/simulate/stream")
+def simulate_session_infection_stream(game_id: str, request: SessionSimulationRequest,
+                                      stop_when_decided: bool = False):
+    """Same as /simulate/stream, for a game created with /new_game?session=true."""
+    session = get_session(game_id)
+    if session is None:
+        return {"error": "Unknown or expired game_id"}
+
+    return _ndjson_stream(stream_bfs_simulation(
+        session.graph,
+        session.source,
+        session.target,
+        request.firewalled_nodes,
+        stop_when_decided=stop_when_decided
+    ))
+
+
+def _cascade_error(request):
+    if not 1 <= request.runs <= MAX_CASCADE_RUNS:
+        return f"runs must be between 1 and {MAX_CASCADE_RUNS}"
+    probabilities = [request.probability] + [p for _, _, p in request.edge_probabilities]
+    if not all(0 <= p <= 1 for p in probabilities):
+        return "Probabilities must be between 0 and 1"
+    return None
+
+
+def _run_cascade(graph, sources, targets, request):
+    return EXECUTOR.run(
+        run_cascade_simulation,
+        graph,
+        sources,
+        targets,
+        request.firewalled_nodes,
+        probability=request.probability,
+        edge_probabilities=request.edge_probabilities,
+        runs=request.runs,
+        seed=request.seed,
+        max_steps=request.max_steps
+    )
+
+
+@router.post("/simulate/cascade")
+async def simulate_cascade(request: CascadeRequest):
+    """
+    Probabilistic spread (independent cascade) from several sources,
+    estimated over `runs` seeded Monte Carlo runs. Returns each node's
+    infection probability and the chance each target is infected.
+    """
+    error = _cascade_error(request)
+    if error:
+        return {"error": error}
+    return await _run_cascade(request.graph, request.sources, request.targets, request)
+
+
+@router.post("/sessions/{game_id}/simulate/cascade")
+async def simulate_session_cascade(game_id: str, request: SessionCascadeRequest):
+    """Same as /simulate/cascade from the game's own source to its target."""
+    session = get_session(game_id)
+    if session is None:
+        return {"error": "Unknown or expired game_id"}
+
+    error = _cascade_error(request)
+    if error:
+        return {"error": error}
+    return await _run_cascade(session.graph, [session.source], [session.target], request)
+
+
+@router.post("/optimal_defense")
+async def optimal_defense(request: OptimalDefenseRequest):
+    """
+    Exact minimum set of firewalls that keeps the target safe, from a
+    max-flow vertex cut on the graph.
+    """
+    return await EXECUTOR.run(optimal_defense_job, request.graph, request.source, request.target)
+
+
+@router.post("/what_if")
+async def what_if(request: WhatIfRequest):
+    """
+    Scores many firewall placements against one graph in a single call,
+    e.g. every single-node or pairwise addition to the current picks.
+    """
+    return await EXECUTOR.run(
+        what_if_job,
+        request.graph,
+        request.source,
+        request.target,
+        request.firewalled_nodes,
+        request.mode,
+        request.candidate_sets
+    )
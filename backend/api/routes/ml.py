@@ -1,44 +1,121 @@
-import joblib
+import hashlib
 import json
 import os
-import pandas as pd
+import threading
+import numpy as np
 import networkx as nx
 from fastapi import APIRouter
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Any, List
 
-from ml.features.extraction import extract_features
+from api.cache import prediction_cache_from_env
+from api.executor import EXECUTOR
+from api.sessions import get_session
+from core.graph.csr import as_csr
+from core.metrics.timing import stage
+from ml.features.extraction import node_features, read_feature_spec
+from ml.inference.forest import FlatForest
 
 router = APIRouter()
 
 # --- Model Loading ---
 MODEL = None
 FEATURE_COLS = None
+# node_features settings recorded at training time (centrality mode)
+FEATURE_OPTIONS = {}
+
+# "pickle" loads rf_model.pkl through joblib (and sklearn); "forest"
+# loads the NumPy arrays written by ml/inference/forest.py instead.
+# MODEL_MMAP=1 memory-maps the forest arrays so workers share their
+# pages. It has no effect on the pickle: sklearn copies every tree's
+# node arrays into its own buffers while unpickling.
+MODEL_FORMAT = os.getenv("MODEL_FORMAT", "pickle")
+MODEL_MMAP = os.getenv("MODEL_MMAP", "0") == "1"
+
+# Seconds a prediction waits for a background load still in progress
+MODEL_LOAD_WAIT = float(os.getenv("MODEL_LOAD_WAIT", 30))
+
+MODEL_STATUS = {"state": "not_loaded", "error": None}
+MODEL_LOADED = threading.Event()
+
+# Rankings keyed by graph fingerprint and endpoints (see api/cache.py)
+PREDICTION_CACHE = prediction_cache_from_env()
+
+def _model_version(paths):
+    """Content hash of the model files, the same in every worker."""
+    digest = hashlib.blake2b(digest_size=8)
+    for path in paths:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
 
 def load_model():
     """Load model and features on startup (works on Render and locally)."""
-    global MODEL, FEATURE_COLS
+    global MODEL, FEATURE_COLS, FEATURE_OPTIONS
+    MODEL_STATUS.update(state="loading", error=None)
     try:
         # Dynamically resolve the model path regardless of working directory
         base_dir = os.path.dirname(os.path.abspath(__file__))
-        model_path = os.path.join(base_dir, "../../ml/models/rf_model.pkl")
-        feature_path = os.path.join(base_dir, "../../ml/models/feature_columns.json")
-
-        # Normalize paths
-        model_path = os.path.normpath(model_path)
-        feature_path = os.path.normpath(feature_path)
+        models_dir = os.path.normpath(os.path.join(base_dir, "../../ml/models"))
+        feature_path = os.path.join(models_dir, "feature_columns.json")
 
-        MODEL = joblib.load(model_path)
+        if MODEL_FORMAT == "forest":
+            model_path = os.path.join(models_dir, "rf_model_forest")
+            MODEL = FlatForest.load(model_path, mmap=MODEL_MMAP)
+            model_files = [os.path.join(model_path, name) for name in sorted(os.listdir(model_path))]
+        else:
+            # Deferred so sklearn is only imported by the loader
+            import joblib
+            model_path = os.path.join(models_dir, "rf_model.pkl")
+            MODEL = joblib.load(model_path)
+            model_files = [model_path]
         with open(feature_path, 'r') as f:
-            FEATURE_COLS = json.load(f)
+            FEATURE_COLS, FEATURE_OPTIONS = read_feature_spec(json.load(f))
+        if list(getattr(MODEL, "feature_names_in_", FEATURE_COLS)) != FEATURE_COLS:
+            raise ValueError("Model and feature_columns.json disagree on the columns")
+        # Predictions get bare matrices in FEATURE_COLS order, which sklearn
+        # would otherwise warn about on every call for a model fitted on a
+        # DataFrame
+        MODEL.__dict__.pop("feature_names_in_", None)
+        # Rankings from a previous model are keyed under its version
+        PREDICTION_CACHE.set_model_version(_model_version(model_files + [feature_path]))
+        MODEL_STATUS.update(state="ready")
 
         print(f"✅ ML model loaded from: {model_path}")
         print(f"✅ Feature columns loaded from: {feature_path}")
 
-    except FileNotFoundError as e:
+    except (FileNotFoundError, ValueError) as e:
         print(f"⚠️ Model loading failed: {e}")
         MODEL = None
         FEATURE_COLS = None
+        MODEL_STATUS.update(state="failed", error=str(e))
+    finally:
+        if MODEL_STATUS["state"] == "loading":
+            MODEL_STATUS.update(state="failed", error="Model loading raised an error")
+        MODEL_LOADED.set()
+
+
+def start_model_loading():
+    """Loads the model on a background thread so the server starts at once."""
+    MODEL_LOADED.clear()
+    MODEL_STATUS.update(state="loading", error=None)
+    threading.Thread(target=load_model, name="model-loader", daemon=True).start()
+
+
+def _model_unavailable():
+    """
+    Waits (up to MODEL_LOAD_WAIT) for a load in progress, then returns
+    an error message if there is still no model, or None.
+    """
+    if MODEL_STATUS["state"] == "loading":
+        MODEL_LOADED.wait(MODEL_LOAD_WAIT)
+    if MODEL is None or FEATURE_COLS is None:
+        return "Model is still loading" if MODEL_STATUS["state"] == "loading" else "Model not loaded"
+    return None
 
 
 class MLRequest(BaseModel):
@@ -48,66 +125,307 @@ class MLRequest(BaseModel):
     k: int = 5  # Number of nodes to return
 
 
-def get_ml_prediction_internal(graph_data, source, target, k=5):
-    """Internal function for other modules to call."""
-    if MODEL is None or FEATURE_COLS is None:
-        return {"error": "Model not loaded", "top_k_nodes": []}
+class SessionMLRequest(BaseModel):
+    k: int = 5  # Number of nodes to return
+
+
+class AdviseRequest(BaseModel):
+    firewalled_nodes: List[int] = []
+    k: int = 5  # Number of nodes to return
 
-    # Rebuild the graph manually
-    G = nx.Graph()
-    for node in graph_data['nodes']:
-        G.add_node(node['id'])
 
-    for link in graph_data['links']:
-        src = link['source']['id'] if isinstance(link['source'], dict) else link['source']
-        tgt = link['target']['id'] if isinstance(link['target'], dict) else link['target']
-        G.add_edge(src, tgt)
+class BatchMLRequest(BaseModel):
+    jobs: List[MLRequest]
 
-    # 1. Extract features
+
+# Cap on jobs answered by one /predict_batch call
+MAX_BATCH_JOBS = 1000
+
+
+def _node_features(graph, source, target, features=None):
+    """(node ids, float32 feature matrix in FEATURE_COLS order) for one job."""
+    if features is not None:
+        computed = features(**FEATURE_OPTIONS)
+    else:
+        computed = node_features(graph, source, target, **FEATURE_OPTIONS)
+    return computed.nodes, computed.matrix(FEATURE_COLS)
+
+
+def _ranking_from_probs(nodes, probs, source, target):
+    """
+    Applies the relative threshold to one job's node probabilities,
+    returning the candidates in rank order plus all node scores.
+    """
+    # Drop source and target
+    keep = (nodes != source) & (nodes != target)
+    nodes = nodes[keep]
+    probs = probs[keep]
+    # Convert to JSON-friendly types
+    node_scores = [list(pair) for pair in zip(nodes.tolist(), probs.tolist())]
+
+    # Threshold and ranking
+    if not len(probs):
+        return {"ranked_nodes": [], "node_scores": node_scores}
+
+    relative_threshold = probs.max() * 0.30
+    # Only the candidates that clear the threshold get sorted; the stable
+    # sort keeps ties in node order
+    candidates = np.flatnonzero(probs >= relative_threshold)
+    ranked = candidates[np.argsort(-probs[candidates], kind="stable")]
+    return {
+        "ranked_nodes": nodes[ranked].tolist(),
+        "node_scores": node_scores
+    }
+
+
+def _rank_nodes(graph, source, target, features=None):
+    """
+    Runs feature extraction and the model, returning every candidate that
+    clears the relative threshold in rank order plus all node scores.
+    Everything is JSON-friendly so the result can go in the shared cache.
+    `features` is a callable returning precomputed features, if any.
+    """
     try:
-        features_df = extract_features(G, source, target)
+        nodes, matrix = _node_features(graph, source, target, features)
     except nx.NetworkXNoPath:
-        return {"error": "No path between source and target", "top_k_nodes": []}
+        return {"error": "No path between source and target"}
 
-    # Ensure columns order
-    features_df = features_df[FEATURE_COLS]
+    # Predict probabilities (prob of class '1')
+    with stage("model"):
+        pred_probs = MODEL.predict_proba(matrix)[:, 1]
+    return _ranking_from_probs(nodes, pred_probs, source, target)
 
-    # 2. Predict probabilities (prob of class '1')
-    pred_probs = MODEL.predict_proba(features_df)[:, 1]
-    prob_series = pd.Series(pred_probs, index=features_df.index)
 
-    # 3. Drop source and target
-    prob_series = prob_series.drop([source, target], errors='ignore')
+def _rank_many(jobs):
+    """
+    Ranks several (graph, source, target) jobs with a single
+    predict_proba call over their stacked feature matrices, then splits
+    the probabilities back out per job.
+    """
+    rankings = [None] * len(jobs)
+    extracted = []
+    owners = []
+    for i, (graph, source, target) in enumerate(jobs):
+        try:
+            extracted.append(_node_features(graph, source, target))
+            owners.append(i)
+        except nx.NetworkXNoPath:
+            rankings[i] = {"error": "No path between source and target"}
 
-    # 4. Threshold and ranking
-    if prob_series.empty:
-        return {
-            "top_k_nodes": [],
-            "all_node_scores": {int(k): float(v) for k, v in prob_series.to_dict().items()}
-        }
+    if extracted:
+        with stage("model"):
+            pred_probs = MODEL.predict_proba(
+                np.concatenate([matrix for _, matrix in extracted])
+            )[:, 1]
+        offset = 0
+        for i, (nodes, _) in zip(owners, extracted):
+            probs = pred_probs[offset:offset + len(nodes)]
+            offset += len(nodes)
+            _, source, target = jobs[i]
+            rankings[i] = _ranking_from_probs(nodes, probs, source, target)
 
-    top_score = prob_series.max()
-    relative_threshold = top_score * 0.30
-    final_nodes_series = prob_series[prob_series >= relative_threshold]
-    final_nodes = final_nodes_series.index.tolist()
-    final_nodes.sort(key=lambda node: prob_series.get(node, 0), reverse=True)
+    return rankings
 
-    # 5. Convert to JSON-friendly types
-    top_k_nodes = [int(node) for node in final_nodes[:k]]
-    all_node_scores = {int(k): float(v) for k, v in prob_series.to_dict().items()}
+
+def _prediction_response(ranking, k):
+    if "error" in ranking:
+        return {"error": ranking["error"], "top_k_nodes": []}
 
     return {
-        "top_k_nodes": top_k_nodes,
-        "all_node_scores": all_node_scores
+        "top_k_nodes": ranking["ranked_nodes"][:k],
+        "all_node_scores": {node: score for node, score in ranking["node_scores"]}
     }
 
 
+def get_ml_prediction_internal(graph_data, source, target, k=5, features=None):
+    """
+    Internal function for other modules to call. `graph_data` may be
+    node-link JSON or a parsed CSRGraph; `features` optionally supplies
+    precomputed features (see GameSession.features).
+    """
+    unavailable = _model_unavailable()
+    if unavailable:
+        return {"error": unavailable, "top_k_nodes": []}
+
+    # Parse once; callers that already hold a CSRGraph pass it straight in
+    graph = as_csr(graph_data)
+
+    # The ranking only depends on the graph and its endpoints, so repeat
+    # submissions of the same game are served from the cache
+    cache_key = PREDICTION_CACHE.key(graph, source, target)
+    ranking = PREDICTION_CACHE.get(cache_key)
+    if ranking is None:
+        ranking = _rank_nodes(graph, source, target, features)
+        PREDICTION_CACHE.set(cache_key, ranking)
+
+    return _prediction_response(ranking, k)
+
+
+def rank_job(graph, source, target, precomputed=None):
+    """
+    _rank_nodes as a self-contained executor job: everything it needs is
+    passed in, so it can run in a worker process. `precomputed` is a
+    session's NodeFeatures, if any.
+    """
+    features = None if precomputed is None else (lambda **options: precomputed)
+    return _rank_nodes(graph, source, target, features)
+
+
+async def _session_features(session):
+    """Session features, extracted on the executor the first time."""
+    if session.cached_features is None:
+        session.store_features(await EXECUTOR.run(
+            node_features, session.graph, session.source, session.target,
+            **FEATURE_OPTIONS
+        ))
+    return session.cached_features
+
+
+async def get_ml_prediction_async(graph_data, source, target, k=5, session=None):
+    """
+    get_ml_prediction_internal for the async routes. The cache is checked
+    here; only misses are sent to the executor.
+    """
+    unavailable = await run_in_threadpool(_model_unavailable)
+    if unavailable:
+        return {"error": unavailable, "top_k_nodes": []}
+
+    graph = await run_in_threadpool(as_csr, graph_data)
+    cache_key = PREDICTION_CACHE.key(graph, source, target)
+    ranking = PREDICTION_CACHE.get(cache_key)
+    if ranking is None:
+        precomputed = await _session_features(session) if session is not None else None
+        ranking = await EXECUTOR.run(rank_job, graph, source, target, precomputed)
+        PREDICTION_CACHE.set(cache_key, ranking)
+
+    return _prediction_response(ranking, k)
+
+
+async def get_ml_predictions_batch(requests):
+    """
+    Batch version of get_ml_prediction_async for a list of MLRequests.
+    Cached jobs are answered directly; the rest share one model call.
+    """
+    unavailable = await run_in_threadpool(_model_unavailable)
+    if unavailable:
+        return [{"error": unavailable, "top_k_nodes": []} for _ in requests]
+
+    graphs = await run_in_threadpool(lambda: [as_csr(request.graph) for request in requests])
+    keys = []
+    rankings = []
+    for graph, request in zip(graphs, requests):
+        key = PREDICTION_CACHE.key(graph, request.source, request.target)
+        keys.append((key, graph))
+        rankings.append(PREDICTION_CACHE.get(key))
+
+    # Identical jobs in one batch are only ranked once
+    pending = {}
+    for (key, graph), request, ranking in zip(keys, requests, rankings):
+        if ranking is None and key not in pending:
+            pending[key] = (graph, request.source, request.target)
+
+    fresh = {}
+    if pending:
+        fresh = dict(zip(pending, await EXECUTOR.run(_rank_many, list(pending.values()))))
+    for key, ranking in fresh.items():
+        PREDICTION_CACHE.set(key, ranking)
+
+    return [
+        _prediction_response(ranking if ranking is not None else fresh[key], request.k)
+        for (key, _), request, ranking in zip(keys, requests, rankings)
+    ]
+
+
 @router.post("/predict")
-def predict_critical_nodes(request: MLRequest):
+async def predict_critical_nodes(request: MLRequest):
     """Predicts the Top-K most critical nodes to block."""
-    return get_ml_prediction_internal(
+    return await get_ml_prediction_async(
         request.graph,
         request.source,
         request.target,
         request.k
     )
+
+
+@router.post("/predict_batch")
+async def predict_critical_nodes_batch(request: BatchMLRequest):
+    """
+    Predicts the Top-K critical nodes for many (graph, source, target)
+    jobs at once, with a single model call. Results follow job order.
+    """
+    if len(request.jobs) > MAX_BATCH_JOBS:
+        return {
+            "error": f"Too many jobs ({len(request.jobs)}), limit is {MAX_BATCH_JOBS}",
+            "results": []
+        }
+    return {"results": await get_ml_predictions_batch(request.jobs)}
+
+
+@router.post("/sessions/{game_id}/predict")
+async def predict_session_critical_nodes(game_id: str, request: SessionMLRequest):
+    """Same as /predict, for a game created with /game/new_game?session=true."""
+    session = get_session(game_id)
+    if session is None:
+        return {"error": "Unknown or expired game_id", "top_k_nodes": []}
+
+    return await get_ml_prediction_async(
+        session.graph,
+        session.source,
+        session.target,
+        request.k,
+        session=session
+    )
+
+
+@router.post("/sessions/{game_id}/advise")
+def advise_session(game_id: str, request: AdviseRequest):
+    """
+    Live advisor: re-ranks the critical nodes for the firewalls placed so
+    far. Only the nodes toggled since the last call are re-analysed, so
+    this can run on every click. The analysis lives in the session, so
+    this stays in-process (on the threadpool) rather than the executor,
+    but it holds an executor slot and so is still turned away with a 429
+    when the server is busy.
+    """
+    session = get_session(game_id)
+    if session is None:
+        return {"error": "Unknown or expired game_id", "top_k_nodes": []}
+
+    unavailable = _model_unavailable()
+    if unavailable:
+        return {"error": unavailable, "top_k_nodes": []}
+
+    with EXECUTOR.reserved(), session.lock:
+        analysis = session.analysis(**FEATURE_OPTIONS)
+        analysis.set_firewalls(request.firewalled_nodes)
+        ranking = _rank_nodes(
+            session.graph, session.source, session.target,
+            features=lambda **options: analysis.features()
+        )
+        target_status = analysis.target_status()
+        infected_count = analysis.infected_count()
+
+    response = _prediction_response(ranking, len(ranking.get("ranked_nodes", [])))
+    placed = set(request.firewalled_nodes)
+    response["top_k_nodes"] = [
+        node for node in response["top_k_nodes"] if node not in placed
+    ][:request.k]
+    response["target_status"] = target_status
+    response["infected_count"] = infected_count
+    return response
+
+
+@router.get("/ready")
+def model_ready():
+    """Readiness probe: 200 once the model is loaded, 503 until then."""
+    ready = MODEL_STATUS["state"] == "ready"
+    return JSONResponse(
+        {**MODEL_STATUS, "format": MODEL_FORMAT, "mmap": MODEL_MMAP and MODEL_FORMAT == "forest"},
+        status_code=200 if ready else 503
+    )
+
+
+@router.get("/cache/stats")
+def prediction_cache_stats():
+    """Hit/miss counters and size of the prediction cache."""
+    return PREDICTION_CACHE.stats()
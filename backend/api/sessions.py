@@ -0,0 +1,71 @@
+import os
+import threading
+import uuid
+
+from api.cache import TTLCache
+from core.graph.csr import as_csr
+from ml.features.extraction import node_features
+from ml.features.incremental import IncrementalAnalysis
+
+
+class GameSession:
+    """
+    A generated game kept server-side: the graph payload sent to the
+    client, its parsed adjacency and, once first needed, its features.
+    """
+
+    def __init__(self, game_id, game_data):
+        self.game_id = game_id
+        self.graph_data = game_data["graph"]
+        self.source = game_data["source"]
+        self.target = game_data["target"]
+        self.graph = as_csr(self.graph_data)
+        self._features = None
+        self._analysis = None
+        # Guards the analysis, which is updated in place as firewalls move
+        self.lock = threading.Lock()
+
+    def features(self, **options):
+        """
+        NodeFeatures for this game, extracted once per session. `options`
+        are the node_features settings the model was trained with.
+        """
+        if self._features is None:
+            self._features = node_features(self.graph, self.source, self.target, **options)
+        return self._features
+
+    @property
+    def cached_features(self):
+        """Features extracted so far, or None."""
+        return self._features
+
+    def store_features(self, features):
+        """Keeps features extracted elsewhere (e.g. on the executor)."""
+        self._features = features
+
+    def analysis(self, **options):
+        """Incremental analysis that follows this game's firewalls."""
+        if self._analysis is None:
+            self._analysis = IncrementalAnalysis(
+                self.graph, self.source, self.target, base_features=self.features(**options)
+            )
+        return self._analysis
+
+
+# Bounded store: least recently used games are evicted first and idle
+# games expire after GAME_SESSION_TTL seconds.
+SESSIONS = TTLCache(
+    max_entries=int(os.getenv("GAME_SESSION_LIMIT", 1000)),
+    ttl=float(os.getenv("GAME_SESSION_TTL", 3600)),
+)
+
+
+def create_session(game_data):
+    session = GameSession(uuid.uuid4().hex, game_data)
+    SESSIONS.set(session.game_id, session)
+    return session
+
+
+def get_session(game_id):
+    """Returns the session, or None if it is unknown or has expired."""
+    return SESSIONS.get(game_id)
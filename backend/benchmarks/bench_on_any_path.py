@@ -0,0 +1,87 @@
+"""
+Benchmarks the "is_on_any_path" feature: the old all_simple_paths scan
+against the block-cut tree engine, across growing graph sizes.
+
+Run from the backend directory:
+    python -m benchmarks.bench_on_any_path --sizes 20 40 80 160 1000 10000
+"""
+import argparse
+import multiprocessing
+import random
+import time
+
+import networkx as nx
+
+from ml.features.paths import nodes_on_any_path
+
+
+def nodes_on_any_path_simple_paths(G, source, target):
+    """The original implementation, kept here as the baseline."""
+    nodes_on_paths = set()
+    if nx.has_path(G, source, target):
+        cutoff = (G.number_of_nodes() // 2) + 2
+        for path in nx.all_simple_paths(G, source, target, cutoff=cutoff):
+            nodes_on_paths.update(path)
+    nodes_on_paths.discard(source)
+    nodes_on_paths.discard(target)
+    return nodes_on_paths
+
+
+def make_graph(num_nodes, avg_degree, seed):
+    """Connected sparse random graph with a far-apart source and target."""
+    rng = random.Random(seed)
+    p = min(1.0, avg_degree / max(1, num_nodes - 1))
+    G = nx.gnp_random_graph(num_nodes, p, seed=rng)
+    # Stitch components together so source and target are always connected
+    components = [next(iter(c)) for c in nx.connected_components(G)]
+    for a, b in zip(components, components[1:]):
+        G.add_edge(a, b)
+    source = 0
+    distances = nx.single_source_shortest_path_length(G, source)
+    target = max(distances, key=distances.get)
+    return G, source, target
+
+
+def _timed_run(fn, args, queue):
+    start = time.perf_counter()
+    fn(*args)
+    queue.put(time.perf_counter() - start)
+
+
+def time_call(fn, *args, budget):
+    """
+    Runs fn once in a child process, giving up (returning None) if it
+    exceeds the budget. all_simple_paths can search for a long time
+    between yields, so the budget has to be enforced from outside.
+    """
+    queue = multiprocessing.Queue()
+    worker = multiprocessing.Process(target=_timed_run, args=(fn, args, queue))
+    worker.start()
+    worker.join(budget)
+    if worker.is_alive():
+        worker.terminate()
+        worker.join()
+        return None
+    return queue.get()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 40, 80, 160, 1000, 10000])
+    parser.add_argument("--avg-degree", type=float, default=3.0)
+    parser.add_argument("--budget", type=float, default=10.0,
+                        help="Seconds before the old scan is reported as a timeout")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'nodes':>8} {'edges':>8} {'simple_paths (s)':>18} {'block_cut (s)':>14}")
+    for n in args.sizes:
+        G, source, target = make_graph(n, args.avg_degree, args.seed)
+        old = time_call(nodes_on_any_path_simple_paths, G, source, target, budget=args.budget)
+        new = time_call(nodes_on_any_path, G, source, target, budget=args.budget)
+        old_text = f"{old:.4f}" if old is not None else f">{args.budget:.0f} (timeout)"
+        print(f"{n:>8} {G.number_of_edges():>8} {old_text:>18} {new:>14.4f}")
+
+
+if __name__ == "__main__":
+    main()
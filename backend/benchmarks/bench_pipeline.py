@@ -0,0 +1,264 @@
+"""
+Benchmarks every stage of the defense pipeline across graph sizes and
+densities: generation, node-link parsing, simulation, each feature of
+extract_features, get_labels, predict_proba, and /game/simulate and
+/ml/predict end to end. Reports p50/p99 latency and peak memory, and
+writes JSON that --compare can check a later run against.
+
+/ml/predict runs twice: ".cold" empties the prediction cache before
+every call, ".warm" keeps it, so cache hits never hide the model's cost.
+/game/simulate reads no cache and runs once; it scores against the exact
+cut whenever one exists, so the model's end-to-end cost is what
+/ml/predict measures.
+
+Run from the backend directory:
+    python -m benchmarks.bench_pipeline --sizes 20 200 2000 --degrees 3 6 --output before.json
+    python -m benchmarks.bench_pipeline --sizes 20 200 2000 --degrees 3 6 --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import networkx as nx
+import numpy as np
+
+from core.graph.csr import CSRGraph
+from core.graph.generation import generate_large_graph
+from core.infection.simulation import run_bfs_simulation
+from ml.features.extraction import (
+    closeness_centrality,
+    distance_features,
+    distance_map,
+    extract_features,
+    get_labels,
+    node_features,
+)
+from ml.features.paths import nodes_on_any_path
+
+
+# O(n*m) stages skipped above --max-exact-nodes
+EXACT_ALL_PAIRS_STAGES = {
+    "feature.betweenness_centrality", "feature.closeness_centrality",
+    "extract_features", "node_features", "predict_proba",
+    "api./game/simulate",
+    "api./ml/predict.cold", "api./ml/predict.warm",
+}
+
+
+def time_stage(fn, repeats):
+    """
+    Runs fn `repeats` times for latency, then once more under tracemalloc
+    for peak memory (kept separate so tracing does not skew the timings).
+    """
+    fn()  # Warm-up: imports, caches, lazily built structures
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    samples_ms = np.array(samples) * 1000
+    return {
+        "p50_ms": float(np.percentile(samples_ms, 50)),
+        "p99_ms": float(np.percentile(samples_ms, 99)),
+        "mean_ms": float(samples_ms.mean()),
+        "peak_kib": peak / 1024,
+        "repeats": repeats,
+    }
+
+
+def pipeline_stages(game, firewalls, model, feature_cols, client):
+    """(name, callable) for every stage, all bound to one generated game."""
+    graph_data, source, target = game["graph"], game["source"], game["target"]
+    graph = CSRGraph.from_node_link(graph_data)
+    G = graph.to_networkx()
+    dist_from_source, dist_to_target = distance_features(graph, source, target)
+    known = {source: distance_map(graph, dist_from_source), target: distance_map(graph, dist_to_target)}
+
+    stages = [
+        ("parse_node_link", lambda: CSRGraph.from_node_link(graph_data)),
+        ("to_networkx", lambda: CSRGraph.from_node_link(graph_data).to_networkx()),
+        ("run_bfs_simulation", lambda: run_bfs_simulation(graph, source, target, firewalls)),
+        ("feature.distances", lambda: distance_features(graph, source, target)),
+        ("feature.degree_centrality", lambda: graph.degrees() / max(1, graph.num_nodes - 1)),
+        ("feature.betweenness_centrality", lambda: nx.betweenness_centrality(G)),
+        ("feature.closeness_centrality", lambda: closeness_centrality(G, known)),
+        ("feature.is_on_any_path", lambda: nodes_on_any_path(G, source, target)),
+        ("extract_features", lambda: extract_features(G, source, target)),
+        ("get_labels", lambda: get_labels(G, source, target)),
+    ]
+    if model is not None:
+        features = node_features(G, source, target).matrix(feature_cols)
+        stages.append(("node_features", lambda: node_features(G, source, target).matrix(feature_cols)))
+        stages.append(("predict_proba", lambda: model.predict_proba(features)))
+    if client is not None:
+        from api.routes.ml import PREDICTION_CACHE
+
+        def cold(fn):
+            def call():
+                PREDICTION_CACHE.clear()
+                return fn()
+            return call
+
+        simulate = lambda: client.post("/game/simulate", json={
+            "graph": graph_data, "source": source, "target": target,
+            "firewalled_nodes": firewalls,
+        })
+        predict = lambda: client.post("/ml/predict", json={
+            "graph": graph_data, "source": source, "target": target,
+        })
+        stages += [
+            ("api./game/simulate", simulate),
+            ("api./ml/predict.cold", cold(predict)),
+            ("api./ml/predict.warm", predict),
+        ]
+    return stages
+
+
+def load_api(with_api):
+    """Model and TestClient for the model and end-to-end stages, if available."""
+    from api.routes import ml
+    ml.load_model()
+    if not with_api:
+        return ml.MODEL, ml.FEATURE_COLS, None
+
+    from fastapi.testclient import TestClient
+    from api.main import app
+    client = TestClient(app)
+    client.__enter__()  # Runs the lifespan (model loading, executor)
+    return ml.MODEL, ml.FEATURE_COLS, client
+
+
+def run(args):
+    model, feature_cols, client = load_api(not args.no_api)
+    results = []
+    for num_nodes in args.sizes:
+        for avg_degree in args.degrees:
+            repeats = max(args.min_repeats, min(args.repeats, int(args.repeats * 200 / num_nodes)))
+            generate = lambda: generate_large_graph(
+                num_nodes, model=args.model, avg_degree=avg_degree, seed=args.seed
+            )
+            game = generate()
+            firewalls = random.Random(args.seed).sample(
+                range(num_nodes), min(5, num_nodes // 10)
+            )
+            edges = len(game["graph"]["links"])
+
+            stages = [("generate_graph", generate)]
+            stages += pipeline_stages(game, firewalls, model, feature_cols, client)
+            for name, fn in stages:
+                if name in args.skip:
+                    continue
+                if num_nodes > args.max_exact_nodes and name in EXACT_ALL_PAIRS_STAGES:
+                    continue
+                record = {"stage": name, "nodes": num_nodes, "avg_degree": avg_degree, "edges": edges}
+                record.update(time_stage(fn, repeats))
+                results.append(record)
+                print(
+                    f"{name:<32} {num_nodes:>7} {avg_degree:>4} {record['p50_ms']:>10.3f}"
+                    f" {record['p99_ms']:>10.3f} {record['peak_kib']:>11.1f}",
+                    flush=True,
+                )
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(results, baseline_path, threshold):
+    """
+    Prints p50 ratios against a previous run and returns the number of
+    stages that got slower by more than `threshold` (e.g. 0.2 = 20%).
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    before = {
+        (r["stage"], r["nodes"], r["avg_degree"]): r for r in baseline["results"]
+    }
+
+    regressions = 0
+    print(f"\n{'stage':<32} {'nodes':>7} {'deg':>4} {'before':>10} {'after':>10} {'ratio':>7}")
+    for record in results:
+        old = before.get((record["stage"], record["nodes"], record["avg_degree"]))
+        if old is None:
+            continue
+        ratio = record["p50_ms"] / old["p50_ms"] if old["p50_ms"] else float("inf")
+        flag = ""
+        if ratio > 1 + threshold:
+            regressions += 1
+            flag = "  REGRESSION"
+        print(
+            f"{record['stage']:<32} {record['nodes']:>7} {record['avg_degree']:>4}"
+            f" {old['p50_ms']:>10.3f} {record['p50_ms']:>10.3f} {ratio:>7.2f}{flag}"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 200, 2000])
+    parser.add_argument("--degrees", type=int, nargs="+", default=[3, 6],
+                        help="Average degrees (density) to sweep")
+    parser.add_argument("--model", default="barabasi_albert",
+                        help="Graph model passed to generate_large_graph")
+    parser.add_argument("--repeats", type=int, default=50,
+                        help="Timed runs per stage on 200-node graphs; scaled down for larger ones")
+    parser.add_argument("--min-repeats", type=int, default=5)
+    parser.add_argument("--max-exact-nodes", type=int, default=5000,
+                        help="Skip all-pairs stages (betweenness, closeness, ...) above this size")
+    parser.add_argument("--skip", nargs="*", default=[], help="Stage names to leave out")
+    parser.add_argument("--no-api", action="store_true",
+                        help="Leave out the end-to-end TestClient stages")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Write results as JSON here")
+    parser.add_argument("--compare", default=None, help="Previous --output file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Relative p50 slowdown reported as a regression")
+    args = parser.parse_args()
+
+    # The in-process pool keeps end-to-end timings free of process start-up
+    os.environ.setdefault("EXECUTOR_KIND", "thread")
+    # The cold stages empty the prediction cache; never let that reach a
+    # shared store the service is using
+    os.environ["PREDICTION_CACHE_BACKEND"] = "memory"
+
+    print(f"{'stage':<32} {'nodes':>7} {'deg':>4} {'p50 (ms)':>10} {'p99 (ms)':>10} {'peak (KiB)':>11}")
+    results = run(args)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"environment": environment(), "args": vars(args), "results": results}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions:
+            print(f"\n{regressions} stage(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
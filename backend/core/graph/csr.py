@@ -0,0 +1,320 @@
+import base64
+import hashlib
+
+import numpy as np
+import networkx as nx
+
+from core.metrics.timing import observe_graph, stage, timed
+
+
+# Compact payload encodings (see CSRGraph.from_compact):
+#   "edges"     - "edges" is a list of [u, v] position pairs
+#   "edges_b64" - "edges" is base64 of the same pairs as little-endian int32
+COMPACT_FORMATS = ("edges", "edges_b64")
+
+
+class GraphFormatError(ValueError):
+    """A graph payload that cannot be decoded; the API answers it with a 400."""
+
+
+def _link_endpoint(endpoint):
+    # The frontend mutates links to be objects {id: ...}, so we get the id
+    return endpoint['id'] if isinstance(endpoint, dict) else endpoint
+
+
+def _node_link_edges(graph_data):
+    """(node ids, edge_u, edge_v) positions from node-link JSON, in link order."""
+    node_ids = [node['id'] for node in graph_data['nodes']]
+    index = {node: i for i, node in enumerate(node_ids)}
+
+    links = graph_data.get('links')
+    if links is None:
+        links = graph_data.get('edges', [])
+
+    edge_u = np.empty(len(links), dtype=np.int64)
+    edge_v = np.empty(len(links), dtype=np.int64)
+    for i, link in enumerate(links):
+        src = _link_endpoint(link['source'])
+        tgt = _link_endpoint(link['target'])
+        # Links may reference nodes missing from the node list; networkx
+        # would add them implicitly, so we do the same.
+        for node in (src, tgt):
+            if node not in index:
+                index[node] = len(node_ids)
+                node_ids.append(node)
+        edge_u[i] = index[src]
+        edge_v[i] = index[tgt]
+    return node_ids, edge_u, edge_v
+
+
+def compact_payload(node_ids, edge_u, edge_v, encoding="edges"):
+    """
+    Graph payload in one of the COMPACT_FORMATS. "nodes" is left out
+    when the ids are simply 0..n-1.
+    """
+    if encoding not in COMPACT_FORMATS:
+        raise ValueError(f"Unknown graph encoding: {encoding}")
+    node_ids = np.asarray(node_ids, dtype=np.int64)
+    edges = np.stack([edge_u, edge_v], axis=1).astype("<i4")
+    payload = {"format": encoding, "num_nodes": len(node_ids)}
+    if not np.array_equal(node_ids, np.arange(len(node_ids))):
+        payload["nodes"] = node_ids.tolist()
+    if encoding == "edges_b64":
+        payload["edges"] = base64.b64encode(edges.tobytes()).decode("ascii")
+    else:
+        payload["edges"] = edges.tolist()
+    return payload
+
+
+def node_link_to_compact(graph_data, encoding="edges"):
+    """Re-encodes node-link JSON compactly, keeping the link order."""
+    return compact_payload(*_node_link_edges(graph_data), encoding=encoding)
+
+
+class CSRGraph:
+    """
+    Compact undirected adjacency in CSR form.
+
+    Nodes are stored by position 0..n-1; `node_ids` maps positions back to
+    the ids used in the JSON payload and `index` maps ids to positions.
+    The neighbors of position i are indices[indptr[i]:indptr[i+1]], in the
+    same order networkx would report them for the same link list.
+    """
+
+    def __init__(self, node_ids, indptr, indices):
+        self.node_ids = np.asarray(node_ids, dtype=np.int64)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.index = {node: i for i, node in enumerate(self.node_ids.tolist())}
+        self._nx_graph = None
+        self._fingerprint = None
+
+    def __getstate__(self):
+        # Sent to worker processes as the arrays alone; the networkx copy
+        # is rebuilt there on demand
+        state = self.__dict__.copy()
+        state["_nx_graph"] = None
+        return state
+
+    # --- Construction ---
+
+    @classmethod
+    def from_edges(cls, node_ids, edge_u, edge_v):
+        """
+        Builds the CSR arrays from edge endpoint positions. Self-loops and
+        duplicate edges are dropped, keeping the first occurrence.
+        """
+        num_nodes = len(node_ids)
+        edge_u = np.asarray(edge_u, dtype=np.int64)
+        edge_v = np.asarray(edge_v, dtype=np.int64)
+
+        keep = edge_u != edge_v
+        edge_u, edge_v = edge_u[keep], edge_v[keep]
+        low, high = np.minimum(edge_u, edge_v), np.maximum(edge_u, edge_v)
+        _, first = np.unique(low * num_nodes + high, return_index=True)
+        first.sort()
+        edge_u, edge_v = edge_u[first], edge_v[first]
+
+        # Each edge becomes two arcs. Sorting arcs by (row, edge position)
+        # keeps every row in link order, like networkx adjacency.
+        rows = np.concatenate([edge_u, edge_v])
+        cols = np.concatenate([edge_v, edge_u])
+        position = np.concatenate([np.arange(len(edge_u))] * 2)
+        order = np.lexsort((position, rows))
+
+        indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=num_nodes), out=indptr[1:])
+        return cls(node_ids, indptr, cols[order])
+
+    @classmethod
+    @timed("graph_parse")
+    def from_node_link(cls, graph_data):
+        """
+        Parses node-link JSON, including links whose endpoints the frontend
+        has replaced with node objects. Accepts both the "links" and
+        "edges" keys that different networkx versions emit.
+        """
+        graph = cls.from_edges(*_node_link_edges(graph_data))
+        observe_graph(graph)
+        return graph
+
+    @classmethod
+    @timed("graph_parse")
+    def from_compact(cls, graph_data):
+        """
+        Decodes a compact payload straight into CSR arrays, with no
+        per-link Python work:
+
+            {"format": "edges" | "edges_b64", "num_nodes": n,
+             "nodes": [ids...],  # optional, defaults to 0..n-1
+             "edges": [[u, v], ...] | "<base64 int32 pairs>"}
+
+        Node ids must be distinct integers; edge endpoints are node
+        positions. Raises GraphFormatError if the payload is malformed.
+        """
+        encoding = graph_data.get("format")
+        if encoding not in COMPACT_FORMATS:
+            raise GraphFormatError(f"Unknown graph encoding: {encoding}")
+        try:
+            num_nodes = int(graph_data["num_nodes"])
+            node_ids = graph_data.get("nodes")
+            if node_ids is None:
+                node_ids = np.arange(num_nodes)
+            else:
+                node_ids = np.asarray(node_ids, dtype=np.int64)
+                if node_ids.shape != (num_nodes,):
+                    raise GraphFormatError("nodes must list num_nodes ids")
+                if len(np.unique(node_ids)) != num_nodes:
+                    raise GraphFormatError("nodes must not repeat an id")
+
+            if encoding == "edges_b64":
+                buffer = base64.b64decode(graph_data["edges"], validate=True)
+                if len(buffer) % 8:
+                    raise GraphFormatError("edges must hold whole int32 pairs")
+                edges = np.frombuffer(buffer, dtype="<i4").reshape(-1, 2)
+            else:
+                edges = np.asarray(graph_data["edges"], dtype=np.int64).reshape(-1, 2)
+        except KeyError as exc:
+            raise GraphFormatError(f"Compact graph is missing {exc}") from exc
+        except (TypeError, ValueError) as exc:
+            if isinstance(exc, GraphFormatError):
+                raise
+            # Includes binascii.Error for invalid base64
+            raise GraphFormatError(f"Malformed {encoding} graph: {exc}") from exc
+        if num_nodes < 0 or len(edges) and (edges.min() < 0 or edges.max() >= num_nodes):
+            raise GraphFormatError("Edge endpoints must be positions below num_nodes")
+
+        graph = cls.from_edges(node_ids, edges[:, 0], edges[:, 1])
+        observe_graph(graph)
+        return graph
+
+    @classmethod
+    def from_networkx(cls, G):
+        node_ids = list(G.nodes())
+        index = {node: i for i, node in enumerate(node_ids)}
+        edges = np.array(
+            [(index[u], index[v]) for u, v in G.edges()], dtype=np.int64
+        ).reshape(-1, 2)
+        graph = cls.from_edges(node_ids, edges[:, 0], edges[:, 1])
+        graph._nx_graph = G
+        return graph
+
+    # --- Accessors ---
+
+    @property
+    def num_nodes(self):
+        return len(self.node_ids)
+
+    @property
+    def num_edges(self):
+        return len(self.indices) // 2
+
+    def degrees(self):
+        return np.diff(self.indptr)
+
+    def neighbors(self, position):
+        return self.indices[self.indptr[position]:self.indptr[position + 1]]
+
+    def expand(self, positions):
+        """
+        Gathers the neighbors of many nodes at once.
+
+        Returns (owner, neighbors): neighbors is every neighbor of every
+        node in `positions`, concatenated row by row in order, and owner[i]
+        is the index into `positions` whose row neighbors[i] came from.
+        """
+        owner, slots = self.expand_slots(positions)
+        return owner, self.indices[slots]
+
+    def expand_slots(self, positions):
+        """
+        Same as expand, but returns the arc slots (offsets into `indices`)
+        instead of the neighbors, for looking up per-arc values.
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        starts = self.indptr[positions]
+        counts = self.indptr[positions + 1] - starts
+        total = int(counts.sum())
+        owner = np.repeat(np.arange(len(positions)), counts)
+        # Offset of each gathered entry inside its own row
+        row_offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        return owner, np.repeat(starts, counts) + row_offsets
+
+    def positions(self, nodes):
+        """Maps node ids to positions, skipping ids not in the graph."""
+        return np.array(
+            [self.index[node] for node in nodes if node in self.index],
+            dtype=np.int64,
+        )
+
+    def fingerprint(self):
+        """
+        Content hash of the graph structure. Independent of node order,
+        link order and link direction, so the same network always hashes
+        the same however the client serialised it.
+        """
+        if self._fingerprint is None:
+            rows = np.repeat(np.arange(self.num_nodes), np.diff(self.indptr))
+            u, v = self.node_ids[rows], self.node_ids[self.indices]
+            keep = u < v
+            edges = np.stack([u[keep], v[keep]], axis=1)
+            edges = edges[np.lexsort((edges[:, 1], edges[:, 0]))]
+
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(np.sort(self.node_ids).tobytes())
+            digest.update(edges.tobytes())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def edge_array(self):
+        """Every edge once, as an (m, 2) int32 array of node positions."""
+        rows = np.repeat(np.arange(self.num_nodes, dtype=np.int32), np.diff(self.indptr))
+        keep = rows < self.indices
+        return np.stack([rows[keep], self.indices[keep]], axis=1)
+
+    def to_compact(self, encoding="edges"):
+        """Compact payload (see from_compact), edges in edge_array order."""
+        edges = self.edge_array()
+        return compact_payload(self.node_ids, edges[:, 0], edges[:, 1], encoding=encoding)
+
+    def to_node_link(self):
+        """Node-link JSON in the shape the frontend renders ("links" key)."""
+        ids = self.node_ids.tolist()
+        edges = self.edge_array().tolist()
+        return {
+            "directed": False,
+            "multigraph": False,
+            "graph": {},
+            "nodes": [{"id": node} for node in ids],
+            "links": [{"source": ids[u], "target": ids[v]} for u, v in edges],
+        }
+
+    def to_networkx(self):
+        """
+        Returns an equivalent networkx.Graph for the algorithms that still
+        need one. Built once and cached on the instance.
+        """
+        if self._nx_graph is None:
+            with stage("graph_rebuild"):
+                G = nx.Graph()
+                ids = self.node_ids.tolist()
+                G.add_nodes_from(ids)
+                indptr = self.indptr.tolist()
+                indices = self.indices.tolist()
+                for i in range(len(ids)):
+                    for j in indices[indptr[i]:indptr[i + 1]]:
+                        if i < j:
+                            G.add_edge(ids[i], ids[j])
+            self._nx_graph = G
+        return self._nx_graph
+
+
+def as_csr(graph):
+    """Accepts a CSRGraph, a networkx graph, a compact payload or node-link JSON."""
+    if isinstance(graph, CSRGraph):
+        return graph
+    if isinstance(graph, nx.Graph):
+        return CSRGraph.from_networkx(graph)
+    if "format" in graph:
+        return CSRGraph.from_compact(graph)
+    return CSRGraph.from_node_link(graph)
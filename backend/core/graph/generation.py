@@ -1,32 +1,35 @@
 import networkx as nx
+import numpy as np
 import random
 
-def generate_graph(min_nodes=15, max_nodes=20):
+from core.graph.csr import CSRGraph
+from core.graph.traversal import bfs_waves
+
+def generate_graph(min_nodes=15, max_nodes=20, seed=None):
     """
     Generates a random connected graph, assigns source and target.
+    Pass `seed` (an int or random.Random) for a reproducible game.
     """
-    num_nodes = random.randint(min_nodes, max_nodes)
+    rng = seed if isinstance(seed, random.Random) else random.Random(seed)
+    num_nodes = rng.randint(min_nodes, max_nodes)
     
     # Create a random graph, ensuring it's connected
     G = None
     while G is None or not nx.is_connected(G):
-        G = nx.erdos_renyi_graph(num_nodes, p=0.10) # 10% density
+        G = nx.erdos_renyi_graph(num_nodes, p=0.10, seed=rng) # 10% density
         
     # Select source (Patient Zero) and target (Critical Patient)
     # Ensure they are not the same node and are reasonably far apart
     nodes = list(G.nodes())
-    source = random.choice(nodes)
-    target = random.choice(nodes)
-    
-    path_len = 0
-    # Keep picking target until it's not the source and at least 2 hops away
-    while target == source or path_len < 2:
-        target = random.choice(nodes)
-        if nx.has_path(G, source, target):
-            path_len = nx.shortest_path_length(G, source, target)
-        else:
-            # This shouldn't happen in a connected graph, but as a fallback
-            path_len = 0 
+    source = rng.choice(nodes)
+
+    # One BFS from the source; the target is drawn from the nodes at least
+    # 2 hops away (or the farthest ones, if the source reaches all nodes
+    # in one hop)
+    distances = nx.single_source_shortest_path_length(G, source)
+    farthest = max(distances.values())
+    min_distance = min(2, farthest)
+    target = rng.choice([node for node in nodes if distances[node] >= min_distance])
             
     # Prepare graph data for JSON output (React-friendly)
     # This is the key fix: add edges="links"
@@ -37,4 +40,163 @@ def generate_graph(min_nodes=15, max_nodes=20):
         "graph": graph_data,
         "source": source,
         "target": target
-    }
\ No newline at end of file
+    }
+
+
+# --- Large topologies ---
+#
+# The generators below build edge arrays directly with NumPy. Each is
+# connected by construction, so there is no redraw loop, and the cost is
+# linear in the number of edges. They are meant for 10k-1M node load tests.
+
+GRAPH_MODELS = ("barabasi_albert", "watts_strogatz", "geometric")
+
+
+def _barabasi_albert_edges(num_nodes, m, rng):
+    """
+    Preferential attachment, vectorised from Batagelj & Brandes' linear
+    algorithm. `slots` is the list of edge endpoints: slot 0 holds node 0,
+    then edge e puts its new node in slot 1 + 2e and its target in slot
+    2 + 2e. The target copies a uniformly random earlier slot, which picks
+    nodes proportionally to degree. Every node's first edge points to an
+    older node, so the graph is connected.
+    """
+    num_edges = (num_nodes - 1) * m
+    owners = 1 + np.arange(num_edges) // m
+    # pick[e] is the earlier slot edge e copies its target from
+    pick = (rng.random(num_edges) * (1 + 2 * np.arange(num_edges))).astype(np.int64)
+
+    # Slots >= 2 at even positions are themselves copied targets; follow
+    # them back until landing on node 0 or on an owner slot.
+    pointer = pick.copy()
+    chained = (pointer >= 2) & (pointer % 2 == 0)
+    while chained.any():
+        pointer[chained] = pick[(pointer[chained] - 2) // 2]
+        chained = (pointer >= 2) & (pointer % 2 == 0)
+
+    targets = np.where(pointer == 0, 0, 1 + ((pointer - 1) // 2) // m)
+    return owners, targets
+
+
+def _watts_strogatz_edges(num_nodes, k, rewire_prob, rng):
+    """
+    Ring lattice where every node links to its k/2 nearest neighbors on
+    each side, then rewiring. The nearest-neighbor ring itself is never
+    rewired, which keeps the graph connected.
+    """
+    half = max(1, (k + 1) // 2)  # Odd k rounds up, as for Barabasi-Albert
+    base = np.repeat(np.arange(num_nodes), half)
+    offset = np.tile(np.arange(1, half + 1), num_nodes)
+    targets = (base + offset) % num_nodes
+
+    rewire = (offset > 1) & (rng.random(len(base)) < rewire_prob)
+    targets[rewire] = rng.integers(0, num_nodes, int(rewire.sum()))
+    return base, targets
+
+
+def _geometric_edges(num_nodes, avg_degree, rng):
+    """
+    Random geometric graph in the unit square, using a grid of cells the
+    size of the connection radius so only neighboring cells are compared.
+    """
+    radius = np.sqrt(avg_degree / (np.pi * num_nodes))
+    points = rng.random((num_nodes, 2))
+    cells_per_side = max(1, int(1 / radius))
+    cell_xy = np.minimum((points * cells_per_side).astype(np.int64), cells_per_side - 1)
+    cell = cell_xy[:, 0] * cells_per_side + cell_xy[:, 1]
+
+    order = np.argsort(cell, kind="stable")
+    sorted_cells = cell[order]
+
+    all_u, all_v = [], []
+    # Half of the 3x3 neighborhood, so each cell pair is compared once
+    for dx, dy in ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1)):
+        nx_, ny_ = cell_xy[:, 0] + dx, cell_xy[:, 1] + dy
+        valid = (nx_ >= 0) & (nx_ < cells_per_side) & (ny_ >= 0) & (ny_ < cells_per_side)
+        u = np.flatnonzero(valid)
+        other = nx_[u] * cells_per_side + ny_[u]
+        lo = np.searchsorted(sorted_cells, other, side="left")
+        hi = np.searchsorted(sorted_cells, other, side="right")
+        counts = hi - lo
+
+        u = np.repeat(u, counts)
+        within = np.arange(len(u)) - np.repeat(np.cumsum(counts) - counts, counts)
+        v = order[np.repeat(lo, counts) + within]
+
+        keep = np.sum((points[u] - points[v]) ** 2, axis=1) <= radius ** 2
+        if dx == 0 and dy == 0:
+            keep &= u < v
+        all_u.append(u[keep])
+        all_v.append(v[keep])
+
+    return np.concatenate(all_u), np.concatenate(all_v)
+
+
+def _connect_components(num_nodes, edge_u, edge_v):
+    """Adds one edge between consecutive components so the graph is connected."""
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    adjacency = coo_matrix(
+        (np.ones(len(edge_u), dtype=np.int8), (edge_u, edge_v)),
+        shape=(num_nodes, num_nodes),
+    )
+    count, labels = connected_components(adjacency, directed=False)
+    if count == 1:
+        return edge_u, edge_v
+
+    # First node of every component, chained together
+    _, representatives = np.unique(labels, return_index=True)
+    return (
+        np.concatenate([edge_u, representatives[:-1]]),
+        np.concatenate([edge_v, representatives[1:]]),
+    )
+
+
+def pick_endpoints(graph, rng, min_distance=2):
+    """
+    Picks a random source and a target at least `min_distance` hops away,
+    from a single BFS over the CSR graph (no retry loop). Falls back to
+    the farthest layer when nothing is that far.
+    """
+    source = int(rng.integers(graph.num_nodes))
+    waves = [wave for wave, _ in bfs_waves(graph, source)]
+    layers = waves[min(min_distance, len(waves) - 1):] if len(waves) > 1 else waves
+    candidates = np.concatenate(layers)
+    target = int(candidates[rng.integers(len(candidates))])
+    return int(graph.node_ids[source]), int(graph.node_ids[target])
+
+
+def generate_large_graph(num_nodes=10000, model="barabasi_albert", avg_degree=4,
+                         rewire_prob=0.1, min_distance=2, seed=None,
+                         output="node_link"):
+    """
+    Generates a large sparse connected network with a source and target.
+
+    `model` is one of GRAPH_MODELS. With output="csr" the graph comes back
+    as a CSRGraph (compact indptr/indices arrays); with "node_link" it is
+    the same JSON shape as generate_graph.
+    """
+    rng = np.random.default_rng(seed)
+
+    if model == "barabasi_albert":
+        # Each new node adds m edges, for a mean degree of 2m. Odd degrees
+        # round up: rounding down would turn avg_degree=3 into a tree
+        edge_u, edge_v = _barabasi_albert_edges(num_nodes, max(1, (avg_degree + 1) // 2), rng)
+    elif model == "watts_strogatz":
+        edge_u, edge_v = _watts_strogatz_edges(num_nodes, avg_degree, rewire_prob, rng)
+    elif model == "geometric":
+        edge_u, edge_v = _geometric_edges(num_nodes, avg_degree, rng)
+        edge_u, edge_v = _connect_components(num_nodes, edge_u, edge_v)
+    else:
+        raise ValueError(f"Unknown graph model: {model}")
+
+    graph = CSRGraph.from_edges(np.arange(num_nodes), edge_u, edge_v)
+    source, target = pick_endpoints(graph, rng, min_distance)
+
+    return {
+        "graph": graph if output == "csr" else graph.to_node_link(),
+        "source": source,
+        "target": target
+    }
+
@@ -0,0 +1,161 @@
+import numpy as np
+
+from core.graph.csr import as_csr
+from core.metrics.timing import timed
+
+
+def _split_node_network(graph, start, goal):
+    """
+    Builds the split-node flow network: every node v becomes v_in = 2v and
+    v_out = 2v + 1 joined by a unit-capacity arc, and every undirected
+    edge becomes two uncapacitated arcs u_out -> v_in and v_out -> u_in.
+    A minimum s-t cut in it can then only cut node arcs, i.e. it is a
+    minimum vertex cut.
+
+    Arcs are stored in pairs (e, e ^ 1) so the reverse arc of e is always
+    e ^ 1. The arcs leaving split node u are order[ptr[u]:ptr[u + 1]].
+    """
+    num_nodes = graph.num_nodes
+    unbounded = num_nodes + 1  # More than any cut could ever need
+
+    inner = np.setdiff1d(np.arange(num_nodes), [start, goal])
+    rows = np.repeat(np.arange(num_nodes), np.diff(graph.indptr))
+    tails = np.concatenate([2 * inner, 2 * rows + 1])
+    heads = np.concatenate([2 * inner + 1, 2 * graph.indices.astype(np.int64)])
+    capacity = np.concatenate([
+        np.ones(len(inner), dtype=np.int64),
+        np.full(len(rows), unbounded, dtype=np.int64),
+    ])
+
+    # Interleave every forward arc with its zero-capacity reverse arc
+    all_tails = np.stack([tails, heads], axis=1).ravel()
+    all_heads = np.stack([heads, tails], axis=1).ravel()
+    all_capacity = np.stack([capacity, np.zeros_like(capacity)], axis=1).ravel()
+
+    order = np.argsort(all_tails, kind="stable")
+    ptr = np.zeros(2 * num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(all_tails, minlength=2 * num_nodes), out=ptr[1:])
+    return all_heads, all_capacity, order, ptr
+
+
+def _out_arcs(order, ptr, nodes):
+    """All arcs leaving `nodes`, gathered with the CSR expand trick."""
+    starts = ptr[nodes]
+    counts = ptr[nodes + 1] - starts
+    offsets = np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts)
+    return order[np.repeat(starts, counts) + offsets]
+
+
+def _levels(heads, capacity, order, ptr, root, sink):
+    """
+    BFS levels over arcs with residual capacity, one whole frontier at a
+    time; -1 where unreachable.
+
+    When the sink is reached, the levels are pruned to the nodes that lie
+    on some shortest augmenting path (a second, backward sweep from the
+    sink), so the DFS never wanders into dead ends of a large graph.
+    """
+    level = np.full(len(ptr) - 1, -1, dtype=np.int64)
+    level[root] = 0
+    frontier = np.array([root], dtype=np.int64)
+    depth = 0
+    while len(frontier) and level[sink] < 0:
+        depth += 1
+        out_arcs = _out_arcs(order, ptr, frontier)
+        out_arcs = out_arcs[capacity[out_arcs] > 0]
+        reached = heads[out_arcs]
+        frontier = np.unique(reached[level[reached] < 0])
+        level[frontier] = depth
+
+    if level[sink] < 0:
+        return level
+
+    # Walk back from the sink: u is useful if it has a residual arc into
+    # a useful node exactly one level deeper
+    useful = np.zeros(len(level), dtype=bool)
+    useful[sink] = True
+    frontier = np.array([sink], dtype=np.int64)
+    while len(frontier):
+        # Arc e leaving v pairs with the arc e ^ 1 running into v
+        into = _out_arcs(order, ptr, frontier) ^ 1
+        tails = heads[into ^ 1]
+        depth_of = np.repeat(level[frontier], np.diff(ptr)[frontier])
+        keep = (capacity[into] > 0) & (level[tails] == depth_of - 1) & ~useful[tails]
+        frontier = np.unique(tails[keep])
+        useful[frontier] = True
+
+    level[~useful] = -1
+    return level
+
+
+def _augment(heads, capacity, order, ptr, level, pointer, root, sink):
+    """
+    Finds one augmenting path in the level graph with an iterative DFS and
+    pushes a unit of flow along it. Returns False when none is left.
+    Only `capacity` is a NumPy array here; the rest are lists, which are
+    much faster to index one element at a time.
+    """
+    path = []  # Arcs taken so far
+    u = root
+    while True:
+        if u == sink:
+            for e in path:
+                capacity[e] -= 1
+                capacity[e ^ 1] += 1
+            return True
+        advanced = False
+        end = ptr[u + 1]
+        while pointer[u] < end:
+            e = order[pointer[u]]
+            v = heads[e]
+            if capacity[e] > 0 and level[v] == level[u] + 1:
+                path.append(e)
+                u = v
+                advanced = True
+                break
+            pointer[u] += 1
+        if not advanced:
+            if not path:
+                return False
+            # Dead end: prune it from the level graph and back up
+            level[u] = -1
+            e = path.pop()
+            u = heads[e ^ 1]
+            pointer[u] += 1
+
+
+@timed("optimal_cut")
+def minimum_vertex_cut(graph, source, target):
+    """
+    Exact minimum s-t vertex cut via Dinic's max-flow on the split-node
+    network. `graph` may be a CSRGraph, a networkx graph or node-link JSON.
+
+    Returns the list of node ids in the cut (its length is the optimal
+    number of firewalls), an empty list if the target is already
+    unreachable, or None when source and target are adjacent and no
+    vertex cut can separate them.
+    """
+    graph = as_csr(graph)
+    start, goal = graph.index[source], graph.index[target]
+    if start == goal or goal in graph.neighbors(start):
+        return None
+
+    heads, capacity, order, ptr = _split_node_network(graph, start, goal)
+    heads_list, order_list, ptr_list = heads.tolist(), order.tolist(), ptr.tolist()
+    root, sink = 2 * start + 1, 2 * goal
+
+    # Unit capacities on every cuttable arc make this O(m * sqrt(n))
+    while True:
+        level = _levels(heads, capacity, order, ptr, root, sink)
+        if level[sink] < 0:
+            break
+        level = level.tolist()
+        pointer = ptr_list[:-1]
+        while _augment(heads_list, capacity, order_list, ptr_list, level, pointer, root, sink):
+            pass
+
+    # The final BFS is the residual reachability from the source; node
+    # arcs leaving that set form the cut closest to the source.
+    reached = level >= 0
+    in_cut = reached[0::2] & ~reached[1::2]
+    return graph.node_ids[in_cut].tolist()
@@ -0,0 +1,48 @@
+import numpy as np
+
+
+def bfs_waves(graph, start, blocked=None):
+    """
+    Breadth-first search over a CSRGraph, one whole level at a time.
+
+    `start` is a node position and `blocked` an optional boolean mask of
+    positions the search may reach but not pass through. Yields
+    (wave, touched) once per level: wave holds the open nodes first
+    reached at that level, in the order a deque BFS would dequeue them,
+    and touched the blocked nodes reached while discovering it. Only the
+    current level and the seen mask are kept in memory.
+    """
+    if blocked is None:
+        blocked = np.zeros(graph.num_nodes, dtype=bool)
+    seen = np.zeros(graph.num_nodes, dtype=bool)
+    seen[start] = True
+    frontier = np.array([start], dtype=np.int64)
+    empty = np.empty(0, dtype=np.int64)
+    yield frontier, empty
+
+    while len(frontier):
+        _, neighbors = graph.expand(frontier)
+        neighbors = neighbors[~seen[neighbors]]
+        # Keep the first discovery of each node, in discovery order
+        _, first = np.unique(neighbors, return_index=True)
+        discovered = neighbors[np.sort(first)]
+        seen[discovered] = True
+
+        hit = blocked[discovered]
+        touched = discovered[hit] if hit.any() else empty
+        frontier = discovered[~hit]
+        if len(frontier) or len(touched):
+            yield frontier, touched
+
+
+def bfs_distances(graph, start, blocked=None):
+    """Hop distance from `start` to every position, -1 where unreachable."""
+    dist = np.full(graph.num_nodes, -1, dtype=np.int64)
+    if blocked is not None and blocked[start]:
+        return dist
+    depth = 0
+    for wave, _ in bfs_waves(graph, start, blocked):
+        if len(wave):
+            dist[wave] = depth
+            depth += 1
+    return dist
@@ -0,0 +1,139 @@
+import numpy as np
+
+from core.graph.csr import as_csr
+from core.infection.frontier import MAX_BATCH_CELLS, firewall_mask
+from core.metrics.timing import timed
+
+# Waves with more than 1/DENSE_WAVE_RATIO of the batch's cells newly
+# infected are deduplicated by scanning a scratch mask instead of sorting
+DENSE_WAVE_RATIO = 64
+
+
+def arc_probabilities(graph, probability, overrides=()):
+    """
+    Spread probability for every arc of `graph` (one value per entry of
+    graph.indices): `probability` everywhere, except the edges listed in
+    `overrides` as (u, v, p) node-id triples, which apply both ways.
+    Edges not in the graph are ignored.
+    """
+    probs = np.full(len(graph.indices), probability, dtype=np.float64)
+    overrides = [(u, v, p) for u, v, p in overrides if u in graph.index and v in graph.index]
+    if not overrides:
+        return probs
+
+    num_nodes = graph.num_nodes
+    rows = np.repeat(np.arange(num_nodes, dtype=np.int64), np.diff(graph.indptr))
+    arc_keys = rows * num_nodes + graph.indices
+    order = np.argsort(arc_keys)
+    sorted_keys = arc_keys[order]
+
+    u = graph.positions([u for u, _, _ in overrides])
+    v = graph.positions([v for _, v, _ in overrides])
+    values = np.array([p for _, _, p in overrides], dtype=np.float64)
+    wanted = np.concatenate([u * num_nodes + v, v * num_nodes + u])
+    values = np.concatenate([values, values])
+    found = np.searchsorted(sorted_keys, wanted)
+    found = np.minimum(found, len(sorted_keys) - 1)
+    hit = sorted_keys[found] == wanted
+    probs[order[found[hit]]] = values[hit]
+    return probs
+
+
+def cascade_batch(graph, starts, blocked, probs, runs, rng, max_steps=None):
+    """
+    Runs `runs` independent cascades at once from the node positions
+    `starts`. Every newly infected node gets one chance to infect each
+    open neighbor, succeeding with that arc's probability in `probs`.
+    Returns the (runs, n) boolean matrix of infected nodes.
+    """
+    num_nodes = graph.num_nodes
+    infected = np.zeros((runs, num_nodes), dtype=bool)
+    scratch = None
+    starts = starts[~blocked[starts]]
+    infected[:, starts] = True
+
+    # The frontier is a flat list of (run, node) pairs, as in batch_reach
+    rows = np.repeat(np.arange(runs), len(starts))
+    nodes = np.tile(starts, runs)
+
+    step = 0
+    while len(rows) and (max_steps is None or step < max_steps):
+        owner, slots = graph.expand_slots(nodes)
+        neighbors = graph.indices[slots].astype(np.int64)
+        owner_rows = rows[owner]
+        # Only attempts on open, still healthy nodes need a coin flip
+        open_ = ~infected[owner_rows, neighbors] & ~blocked[neighbors]
+        owner_rows, neighbors, slots = owner_rows[open_], neighbors[open_], slots[open_]
+        fired = rng.random(len(slots)) < probs[slots]
+
+        cells = owner_rows[fired] * num_nodes + neighbors[fired]
+        if len(cells) * DENSE_WAVE_RATIO > infected.size:
+            # Both ways give the cells sorted, so results do not depend on it
+            if scratch is None:
+                scratch = np.zeros(infected.size, dtype=bool)
+            scratch[cells] = True
+            cells = np.flatnonzero(scratch)
+            scratch[cells] = False
+        else:
+            cells = np.unique(cells)
+        rows, nodes = cells // num_nodes, cells % num_nodes
+        infected[rows, nodes] = True
+        step += 1
+
+    return infected
+
+
+@timed("cascade")
+def run_cascade_simulation(graph_data, sources, targets=(), firewalled_nodes=(),
+                           probability=0.1, edge_probabilities=(), runs=1000,
+                           seed=0, max_steps=None):
+    """
+    Monte Carlo independent cascade: the infection starts from every node
+    in `sources` at once, and each newly infected node infects each
+    neighbor with probability `probability` (or the per-edge value in
+    `edge_probabilities`, given as (u, v, p) triples). Firewalled nodes
+    are never infected, so a firewalled source does not spread.
+    `max_steps` optionally limits how many waves each cascade runs.
+
+    All `runs` cascades are simulated together as array operations, in
+    chunks bounded by MAX_BATCH_CELLS, with a generator seeded by
+    `seed`: the same inputs always give the same estimates. Returns the
+    share of runs in which each node was infected (nodes never infected
+    are left out), the same per target, the chance that any target was
+    infected and the mean number of infected nodes.
+    """
+    graph = as_csr(graph_data)
+    blocked = firewall_mask(graph, firewalled_nodes)
+    # Each source starts infected once, however often it is listed
+    starts = np.unique(graph.positions(sources))
+    goals = graph.positions(targets)
+    probs = arc_probabilities(graph, probability, edge_probabilities)
+    rng = np.random.default_rng(seed)
+
+    counts = np.zeros(graph.num_nodes, dtype=np.int64)
+    any_target = 0
+    total_infected = 0
+    chunk = max(1, MAX_BATCH_CELLS // max(1, graph.num_nodes))
+    for offset in range(0, runs, chunk):
+        infected = cascade_batch(
+            graph, starts, blocked, probs, min(chunk, runs - offset), rng, max_steps
+        )
+        counts += infected.sum(axis=0)
+        total_infected += int(infected.sum())
+        if len(goals):
+            any_target += int(infected[:, goals].any(axis=1).sum())
+
+    reached = np.flatnonzero(counts)
+    node_probabilities = counts / max(runs, 1)
+    return {
+        "runs": runs,
+        "seed": seed,
+        "node_probabilities": dict(zip(
+            graph.node_ids[reached].tolist(), node_probabilities[reached].tolist()
+        )),
+        "target_probabilities": dict(zip(
+            graph.node_ids[goals].tolist(), node_probabilities[goals].tolist()
+        )),
+        "any_target_probability": any_target / max(runs, 1),
+        "mean_infected": total_infected / max(runs, 1),
+    }
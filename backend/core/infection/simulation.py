@@ -1,41 +1,27 @@
-from collections import deque
-import networkx as nx # <-- Make sure this import is here
+import numpy as np
 
+from core.graph.csr import as_csr
+from core.graph.traversal import bfs_waves
+from core.infection.frontier import firewall_mask, frontier_bfs
+from core.metrics.timing import timed
+
+@timed("bfs")
 def run_bfs_simulation(graph_data, source, target, firewalled_nodes):
     """
     Runs a BFS simulation on the graph, stopping at firewalled nodes.
     Returns the infection order and status of the target.
+
+    `graph_data` may be node-link JSON or an already parsed CSRGraph, so
+    callers that also need the graph elsewhere only parse it once.
     """
-    
-    # --- THIS IS THE FIX ---
-    # Recreate graph from JSON data consistently using networkx
-    # This correctly handles the graph structure sent from the frontend.
-    # G = nx.node_link_graph(graph_data, edges="links")
-    # Rebuild the graph manually because the frontend mutates link objects
-    G = nx.Graph()
-    for node in graph_data['nodes']:
-        G.add_node(node['id'])
-        
-    for link in graph_data['links']:
-        # Frontend mutates links to be objects {id: ...}, so we get the id
-        src = link['source']['id'] if isinstance(link['source'], dict) else link['source']
-        tgt = link['target']['id'] if isinstance(link['target'], dict) else link['target']
-        G.add_edge(src, tgt)
-
-    # Now we must manually recreate the adjacency list `adj`
-    adj = {node: list(G.neighbors(node)) for node in G.nodes()}
-    
-    # Get adjacency list directly from the graph object
-    adj = G.adj
-    # --- END OF FIX ---
-        
-    queue = deque([source])
-    infected = {source}
-    infection_order = [source] # Order of infection
-    
+    graph = as_csr(graph_data)
+    blocked = firewall_mask(graph, firewalled_nodes)
+    start = graph.index[source]
+    goal = graph.index.get(target)
+
     target_status = "SAFE"
     
-    if source in firewalled_nodes:
+    if blocked[start]:
         # Source was firewalled, infection doesn't even start
         return {
             "status": "STOPPED_AT_SOURCE",
@@ -43,31 +29,80 @@ def run_bfs_simulation(graph_data, source, target, firewalled_nodes):
             "infected_nodes": [source],
             "target_status": target_status
         }
-    
-    while queue:
-        current_node = queue.popleft()
-        
-        if current_node == target:
-            target_status = "INFECTED"
-            # We don't stop, let the infection spread fully
-            
-        # This loop now works correctly because 'adj' is a networkx
-        # adjacency view, and 'neighbor' will be the node ID (e.g., 3)
-        for neighbor in adj[current_node]:
-            if neighbor not in infected:
-                # Check for firewall
-                if neighbor in firewalled_nodes:
-                    infected.add(neighbor) # Mark as infected to avoid re-check
-                    # Don't add to queue, spread stops here
-                else:
-                    infected.add(neighbor)
-                    infection_order.append(neighbor)
-                    queue.append(neighbor)
-                    
+
+    # Spread one whole frontier at a time. Firewalled nodes the infection
+    # touches are reported as infected, but the spread stops there.
+    waves, touched = frontier_bfs(graph, start, blocked)
+    infection_order = np.concatenate(waves)
+
+    if goal is not None and not blocked[goal] and (infection_order == goal).any():
+        target_status = "INFECTED"
+        # We don't stop, let the infection spread fully
+
     return {
         "status": "COMPLETED",
-        "infection_order": infection_order,
-        "infected_nodes": list(infected),
+        "infection_order": graph.node_ids[infection_order].tolist(),
+        "infected_nodes": graph.node_ids[np.concatenate([infection_order, touched])].tolist(),
         "target_status": target_status
     }
 
+
+def stream_bfs_simulation(graph_data, source, target, firewalled_nodes, stop_when_decided=False):
+    """
+    Same spread as run_bfs_simulation, yielded one BFS wave at a time as
+    JSON-friendly messages, so a client can animate the first frames
+    before the whole infection is known.
+
+    Every wave message lists the newly infected nodes and the firewalls
+    they touched. A final "done" message carries the status, the
+    target's status and the total infected count. With
+    stop_when_decided=True the stream ends as soon as the target's
+    status can no longer change (it was infected, or it is firewalled).
+
+    The graph is parsed and the endpoints looked up before this returns,
+    so an unknown source raises KeyError here rather than mid-stream.
+    """
+    graph = as_csr(graph_data)
+    blocked = firewall_mask(graph, firewalled_nodes)
+    start = graph.index[source]
+    goal = graph.index.get(target)
+    return _wave_messages(graph, blocked, source, start, goal, stop_when_decided)
+
+
+def _wave_messages(graph, blocked, source, start, goal, stop_when_decided):
+    target_protected = goal is None or blocked[goal]
+
+    if blocked[start]:
+        # Source was firewalled, infection doesn't even start
+        yield {"type": "wave", "step": 0, "infected": [source], "touched_firewalls": []}
+        yield {
+            "type": "done",
+            "status": "STOPPED_AT_SOURCE",
+            "target_status": "SAFE",
+            "infected_count": 1
+        }
+        return
+
+    target_status = "SAFE"
+    infected_count = 0
+    status = "COMPLETED"
+    for step, (wave, touched) in enumerate(bfs_waves(graph, start, blocked)):
+        infected_count += len(wave) + len(touched)
+        yield {
+            "type": "wave",
+            "step": step,
+            "infected": graph.node_ids[wave].tolist(),
+            "touched_firewalls": graph.node_ids[touched].tolist()
+        }
+        if not target_protected and (wave == goal).any():
+            target_status = "INFECTED"
+        if stop_when_decided and (target_protected or target_status == "INFECTED"):
+            status = "DECIDED"
+            break
+
+    yield {
+        "type": "done",
+        "status": status,
+        "target_status": target_status,
+        "infected_count": infected_count
+    }
@@ -0,0 +1,186 @@
+import bisect
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+# Histogram buckets (upper bounds) per metric family
+SECONDS_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+SIZE_BUCKETS = (10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 50000, 100000, 500000)
+
+METRIC_BUCKETS = {
+    "stage_seconds": SECONDS_BUCKETS,
+    "request_seconds": SECONDS_BUCKETS,
+    "graph_nodes": SIZE_BUCKETS,
+    "graph_edges": SIZE_BUCKETS,
+}
+
+# Observations made while a request (or an executor job) is running are
+# collected here and recorded once it ends; see collect().
+_COLLECTOR = contextvars.ContextVar("metrics_collector", default=None)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Thread-safe store of labelled histograms and counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}  # (metric, labels) -> Histogram
+        self.counters = {}  # (metric, labels) -> int
+
+    def observe(self, metric, labels, value):
+        key = (metric, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(METRIC_BUCKETS[metric])
+            histogram.observe(value)
+
+    def increment(self, metric, labels, amount=1):
+        key = (metric, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def render(self, prefix="nfd"):
+        """Prometheus text exposition of everything recorded so far."""
+        lines = []
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+
+        declared = set()
+        for (metric, labels), histogram in histograms:
+            name = f"{prefix}_{metric}"
+            if name not in declared:
+                lines.append(f"# TYPE {name} histogram")
+                declared.add(name)
+            cumulative = 0
+            bounds = [str(bound) for bound in histogram.buckets] + ["+Inf"]
+            for bound, count in zip(bounds, histogram.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {histogram.sum}")
+            lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+
+        for (metric, labels), value in counters:
+            name = f"{prefix}_{metric}"
+            if name not in declared:
+                lines.append(f"# TYPE {name} counter")
+                declared.add(name)
+            lines.append(f"{name}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+REGISTRY = Registry()
+
+
+def record(metric, labels, value):
+    """
+    Records one observation: into the active collector if there is one
+    (it is flushed when the request ends), else straight to REGISTRY.
+    """
+    collector = _COLLECTOR.get()
+    if collector is not None:
+        collector.append((metric, labels, value))
+    else:
+        REGISTRY.observe(metric, labels, value)
+
+
+@contextmanager
+def stage(name):
+    """Times the enclosed block as pipeline stage `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record("stage_seconds", (("stage", name),), time.perf_counter() - start)
+
+
+def observe_graph(graph):
+    """Records the size of a graph a request worked on."""
+    record("graph_nodes", (), graph.num_nodes)
+    record("graph_edges", (), graph.num_edges)
+
+
+@contextmanager
+def collect():
+    """
+    Collects the observations made inside the block (and in threads it
+    starts with a copied context) into a list, instead of recording them.
+    """
+    collected = []
+    token = _COLLECTOR.set(collected)
+    try:
+        yield collected
+    finally:
+        _COLLECTOR.reset(token)
+
+
+def run_collecting(fn, *args, **kwargs):
+    """
+    Runs fn and returns (result, observations), so work done on a worker
+    process can be recorded by the process that serves the request.
+    """
+    with collect() as collected:
+        result = fn(*args, **kwargs)
+    return result, collected
+
+
+def replay(observations):
+    """Records observations returned by run_collecting."""
+    for metric, labels, value in observations:
+        record(metric, labels, value)
+
+
+def flush(observations):
+    """Writes collected observations to REGISTRY."""
+    for metric, labels, value in observations:
+        REGISTRY.observe(metric, labels, value)
+
+
+def server_timing(observations):
+    """Server-Timing header value: total time spent per stage."""
+    totals = {}
+    for metric, labels, value in observations:
+        if metric == "stage_seconds":
+            name = labels[0][1]
+            totals[name] = totals.get(name, 0.0) + value
+    return ", ".join(
+        f"{name.replace('.', '-')};dur={seconds * 1000:.3f}" for name, seconds in totals.items()
+    )
+
+
+def timed(name):
+    """Decorator form of stage()."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
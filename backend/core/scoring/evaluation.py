@@ -1,6 +1,17 @@
-def calculate_score(target_status, user_picks, ml_picks):
+from core.metrics.timing import timed
+
+
+@timed("scoring")
+def calculate_score(target_status, user_picks, ml_picks=(), min_cut_size=None, endpoints=()):
     """
     Calculates the player's score based on success and resources used.
+
+    When the size of a minimum source-target vertex cut is known
+    (`min_cut_size`), the bonus rewards optimality rather than overlap
+    with the ML picks: minimum cuts are often not unique, so every
+    separating set of that size earns the full bonus, and larger ones
+    earn min_cut_size / len(user_picks) of it. Firewalls on the
+    `endpoints` (source and target) are not a vertex cut and earn none.
     """
     if target_status == "INFECTED":
         return {
@@ -14,22 +25,29 @@ def calculate_score(target_status, user_picks, ml_picks):
     # 1. Penalty for resources used
     resource_penalty = len(user_picks) * 500
     
-    # 2. Bonus for efficiency (comparing to ML picks)
-    # We use Jaccard Similarity: (Intersection / Union)
+    # 2. Bonus for efficiency (max 2000 bonus points)
     set_user = set(user_picks)
-    set_ml = set(ml_picks)
-    
-    intersection = len(set_user.intersection(set_ml))
-    union = len(set_user.union(set_ml))
-    
     similarity_bonus = 0
-    if union > 0:
-        similarity = intersection / union
-        similarity_bonus = int(similarity * 2000) # Max 2000 bonus points
+    if min_cut_size is not None:
+        # The target is safe, so the picks separate it from the source.
+        # Any separating set has at least min_cut_size nodes (Menger).
+        bonus_label = "Optimal Bonus"
+        if not set_user & set(endpoints):
+            efficiency = min_cut_size / len(set_user) if set_user else 1.0
+            similarity_bonus = int(efficiency * 2000)
+    else:
+        # Comparing to ML picks with Jaccard Similarity: (Intersection / Union)
+        bonus_label = "ML Bonus"
+        set_reference = set(ml_picks)
+        intersection = len(set_user.intersection(set_reference))
+        union = len(set_user.union(set_reference))
+        if union > 0:
+            similarity = intersection / union
+            similarity_bonus = int(similarity * 2000)
         
     final_score = base_score - resource_penalty + similarity_bonus
     
     return {
         "score": max(0, final_score), # Ensure score doesn't go below 0
-        "message": f"Success! Target is safe. Base: {base_score}, Penalty: -{resource_penalty}, ML Bonus: +{similarity_bonus}"
+        "message": f"Success! Target is safe. Base: {base_score}, Penalty: -{resource_penalty}, {bonus_label}: +{similarity_bonus}"
     }
\ No newline at end of file
@@ -1,65 +1,320 @@
+import math
+import random
+
 import networkx as nx
-import pandas as pd
+import numpy as np
+
+from core.graph.csr import as_csr
+from core.graph.traversal import bfs_distances
+from core.metrics.timing import stage, timed
+from ml.features.paths import nodes_on_any_path
 
-def extract_features(G, source, target):
+@timed("features.distances")
+def distance_features(graph, source, target):
     """
-    Extracts features for each node in the graph.
+    Computes the S-T distances of every node position with one BFS from
+    the source and one from the target over the CSR arrays. Unreachable
+    nodes get -1.
     """
-    features = {}
-    
-    # 1. Global centrality measures
-    degree_centrality = nx.degree_centrality(G)
-    betweenness_centrality = nx.betweenness_centrality(G)
-    closeness_centrality = nx.closeness_centrality(G)
-    
-    # 2. Get all nodes on *any* simple path between source and target
-    # This feature is CRITICAL to match the 'minimum_node_cut' label,
-    # which also considers all paths.
-    nodes_on_paths = set()
-    if nx.has_path(G, source, target):
-        try:
-            # Set a cutoff to prevent searching billions of paths on dense graphs
-            # A cutoff of 10-12 on a 20-node graph is reasonable.
-            cutoff = (G.number_of_nodes() // 2) + 2 
-            for path in nx.all_simple_paths(G, source, target, cutoff=cutoff):
-                 nodes_on_paths.update(path)
-        except (nx.NetworkXNoPath, nx.NetworkXError):
-            pass # No paths found or other error
-            
-    nodes_on_paths.discard(source)
-    nodes_on_paths.discard(target)
+    graph = as_csr(graph)
+    dist_from_source = bfs_distances(graph, graph.index[source])
+    # The graph is undirected, so distance *to* the target is the
+    # distance *from* it.
+    dist_to_target = bfs_distances(graph, graph.index[target])
+    return dist_from_source, dist_to_target
+
 
+def distance_map(graph, dist):
+    """A distance array as {node id: distance} for the reachable nodes."""
+    reached = np.flatnonzero(dist >= 0)
+    return dict(zip(graph.node_ids[reached].tolist(), dist[reached].tolist()))
+
+
+@timed("features.closeness")
+def closeness_centrality(G, known_distances=None):
+    """
+    Same values as nx.closeness_centrality (wf_improved), but reuses BFS
+    distance maps that have already been computed for some nodes.
+    """
+    known_distances = known_distances or {}
+    num_nodes = G.number_of_nodes()
+    closeness = {}
     for node in G.nodes():
-        has_path_to_target = nx.has_path(G, node, target)
-        has_path_from_source = nx.has_path(G, source, node)
-
-        features[node] = {
-            "degree_centrality": degree_centrality.get(node, 0),
-            "betweenness_centrality": betweenness_centrality.get(node, 0),
-            "closeness_centrality": closeness_centrality.get(node, 0),
-            
-            # New S-T Specific Features:
-            "is_on_any_path": 1 if node in nodes_on_paths else 0,
-            
-            "distance_from_source": nx.shortest_path_length(G, source, node) 
-                                    if has_path_from_source else -1,
-                                    
-            "distance_to_target": nx.shortest_path_length(G, node, target) 
-                                  if has_path_to_target else -1 
-        }
-        
-    return pd.DataFrame.from_dict(features, orient='index')
+        distances = known_distances.get(node)
+        if distances is None:
+            distances = nx.single_source_shortest_path_length(G, node)
+        total = sum(distances.values())
+        reachable = len(distances)
+        if total > 0 and num_nodes > 1:
+            closeness[node] = ((reachable - 1) / total) * ((reachable - 1) / (num_nodes - 1))
+        else:
+            closeness[node] = 0.0
+    return closeness
+
+
+# How betweenness and closeness are computed:
+#   "exact"   - all-pairs BFS, O(n*m)
+#   "sampled" - BFS from k random pivots only, O(k*m)
+#   "st"      - betweenness restricted to shortest source-target paths,
+#               O(m), with sampled closeness
+CENTRALITY_MODES = ("exact", "sampled", "st")
+
+
+def pivot_count(num_nodes, epsilon):
+    """
+    Pivots needed for sampled centralities to be within epsilon * diameter
+    (closeness, Eppstein & Wang) or epsilon (normalised betweenness,
+    Brandes & Pich) of the exact values with high probability:
+    ceil(ln(n) / epsilon^2), capped at n.
+    """
+    if num_nodes < 2:
+        return num_nodes
+    return min(num_nodes, math.ceil(math.log(num_nodes) / epsilon ** 2))
+
+
+@timed("features.closeness")
+def sampled_closeness_centrality(G, pivots, known_distances=None):
+    """
+    Estimates closeness_centrality (wf_improved) from BFS runs out of the
+    `pivots` only. Each node's total distance is its mean distance to the
+    pivots in its component times the component size; components that
+    no pivot landed in are computed exactly.
+    """
+    known_distances = known_distances or {}
+    num_nodes = G.number_of_nodes()
+    totals = dict.fromkeys(G, 0)
+    hits = dict.fromkeys(G, 0)
+    for pivot in pivots:
+        distances = known_distances.get(pivot)
+        if distances is None:
+            distances = nx.single_source_shortest_path_length(G, pivot)
+        for node, distance in distances.items():
+            totals[node] += distance
+            hits[node] += 1
+
+    closeness = {}
+    for component in nx.connected_components(G):
+        reachable = len(component)
+        for node in component:
+            if hits[node]:
+                total = totals[node] * reachable / hits[node]
+            else:
+                total = sum(nx.single_source_shortest_path_length(G, node).values())
+            if total > 0 and num_nodes > 1:
+                closeness[node] = ((reachable - 1) / total) * ((reachable - 1) / (num_nodes - 1))
+            else:
+                closeness[node] = 0.0
+    return closeness
+
+
+def st_betweenness_centrality(G, source, target, dist_from_source, dist_to_target):
+    """
+    Fraction of the shortest source-target paths that pass through each
+    node, from path counts along the two BFS distance maps.
+    """
+    def path_counts(root, distances):
+        counts = {root: 1}
+        for node in sorted(distances, key=distances.get)[1:]:
+            counts[node] = sum(
+                counts[neighbor] for neighbor in G[node]
+                if distances.get(neighbor) == distances[node] - 1
+            )
+        return counts
+
+    st_distance = dist_from_source.get(target)
+    if st_distance is None:
+        return dict.fromkeys(G, 0.0)
+
+    from_source = path_counts(source, dist_from_source)
+    to_target = path_counts(target, dist_to_target)
+    total = from_source[target]
+    betweenness = dict.fromkeys(G, 0.0)
+    for node, distance in dist_from_source.items():
+        if node not in (source, target) and distance + dist_to_target.get(node, -1) == st_distance:
+            betweenness[node] = from_source[node] * to_target[node] / total
+    return betweenness
+
+
+# Feature columns in the order node_features writes them, which is also
+# the order train.py saves to feature_columns.json
+FEATURES = (
+    "degree_centrality", "betweenness_centrality", "closeness_centrality",
+    "is_on_any_path", "distance_from_source", "distance_to_target",
+)
+# Columns holding whole numbers, given back as integers by to_frame
+INTEGER_FEATURES = ("is_on_any_path", "distance_from_source", "distance_to_target")
+
+
+class NodeFeatures:
+    """
+    Per-node features as one (n, len(FEATURES)) float32 matrix, rows in
+    `nodes` order and columns in FEATURES order. float32 is what the
+    forests compare against their thresholds, so the serving path passes
+    the matrix on as it is; only training turns it into a DataFrame.
+    """
+
+    def __init__(self, nodes, values):
+        self.nodes = nodes
+        self.values = values
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def column(self, name):
+        return self.values[:, FEATURES.index(name)]
+
+    def replace(self, **columns):
+        """Copy with some columns overwritten."""
+        values = self.values.copy()
+        for name, column in columns.items():
+            values[:, FEATURES.index(name)] = column
+        return NodeFeatures(self.nodes, values)
+
+    def matrix(self, order, dtype=np.float32):
+        """
+        The features as an (n, len(order)) matrix in column order `order`:
+        the matrix itself when the order and dtype already match, else a
+        reordered copy.
+        """
+        if tuple(order) == FEATURES and dtype == self.values.dtype:
+            return self.values
+        return self.values[:, [FEATURES.index(name) for name in order]].astype(dtype)
+
+    def to_frame(self):
+        # Deferred so only training needs pandas
+        import pandas as pd
+        frame = pd.DataFrame(self.values, index=self.nodes, columns=list(FEATURES))
+        return frame.astype({name: np.int64 for name in INTEGER_FEATURES})
+
+
+def _fill(values, name, nodes, mapping, default=0):
+    """Writes {node: value} into column `name` of the feature matrix."""
+    values[:, FEATURES.index(name)] = np.fromiter(
+        (mapping.get(node, default) for node in nodes), dtype=values.dtype, count=len(nodes)
+    )
+
+
+@timed("features")
+def node_features(G, source, target, centrality="exact", epsilon=0.1, seed=0):
+    """
+    Extracts features for each node in the graph as NodeFeatures.
+    `G` may be a networkx graph or a CSRGraph. Degrees and distances come
+    straight from the CSR arrays; the centralities and path membership
+    still run on the networkx graph.
+
+    `centrality` picks how betweenness and closeness are computed (see
+    CENTRALITY_MODES); the sampled modes use pivot_count(n, epsilon)
+    pivots drawn with `seed`, so the same graph always gets the same
+    features. Training and serving must use the same settings, which is
+    why train.py records them in feature_columns.json.
+    """
+    if centrality not in CENTRALITY_MODES:
+        raise ValueError(f"Unknown centrality mode: {centrality}")
+    # A networkx graph becomes the CSR graph's cached networkx copy, so
+    # it is not rebuilt below
+    graph = as_csr(G)
+    G = graph.to_networkx()
+    num_nodes = graph.num_nodes
+
+    # Every feature is written straight into this one matrix
+    values = np.empty((num_nodes, len(FEATURES)), dtype=np.float32)
+
+    # 1. S-T distances: two BFS runs over the arrays cover every node
+    source_distances, target_distances = distance_features(graph, source, target)
+    values[:, FEATURES.index("distance_from_source")] = source_distances
+    values[:, FEATURES.index("distance_to_target")] = target_distances
+    dist_from_source = distance_map(graph, source_distances)
+    dist_to_target = distance_map(graph, target_distances)
+    known_distances = {source: dist_from_source, target: dist_to_target}
+
+    # 2. Global centrality measures
+    # Degree centrality as networkx defines it, from the row lengths
+    values[:, FEATURES.index("degree_centrality")] = (
+        graph.degrees() / (num_nodes - 1) if num_nodes > 1 else 1.0
+    )
+    # Closeness reuses the source and target BFS runs from step 1.
+    num_pivots = pivot_count(G.number_of_nodes(), epsilon)
+    sampled = centrality != "exact" and num_pivots < G.number_of_nodes()
+    with stage("features.betweenness"):
+        if centrality == "st":
+            betweenness_centrality = st_betweenness_centrality(
+                G, source, target, dist_from_source, dist_to_target
+            )
+        elif sampled:
+            betweenness_centrality = nx.betweenness_centrality(G, k=num_pivots, seed=seed)
+        else:
+            betweenness_centrality = nx.betweenness_centrality(G)
+    if sampled:
+        pivots = random.Random(seed).sample(list(G.nodes()), num_pivots)
+        closeness = sampled_closeness_centrality(G, pivots, known_distances)
+    else:
+        closeness = closeness_centrality(G, known_distances)
+
+    # 3. Get all nodes on *any* simple path between source and target
+    # This feature is CRITICAL to match the 'minimum_node_cut' label,
+    # which also considers all paths. Computed from the block-cut tree
+    # in linear time rather than by enumerating the paths themselves.
+    nodes_on_paths = nodes_on_any_path(G, source, target)
+
+    # Rows follow the CSR positions, which is also G's node order
+    nodes = graph.node_ids.tolist()
+    _fill(values, "betweenness_centrality", nodes, betweenness_centrality)
+    _fill(values, "closeness_centrality", nodes, closeness)
+    # New S-T Specific Feature:
+    on_path = values[:, FEATURES.index("is_on_any_path")]
+    on_path[:] = 0
+    on_path[graph.positions(nodes_on_paths)] = 1
+    return NodeFeatures(graph.node_ids, values)
+
+
+def extract_features(G, source, target, centrality="exact", epsilon=0.1, seed=0):
+    """
+    node_features as a DataFrame indexed by node, for training.
+    Same arguments as node_features.
+    """
+    return node_features(
+        G, source, target, centrality=centrality, epsilon=epsilon, seed=seed
+    ).to_frame()
+
+def feature_spec(columns, centrality="exact", epsilon=0.1, seed=0):
+    """The feature_columns.json contents: column order plus the settings."""
+    return {
+        "columns": list(columns),
+        "centrality": {"mode": centrality, "epsilon": epsilon, "seed": seed},
+    }
+
+
+def read_feature_spec(spec):
+    """
+    Splits feature_columns.json into (columns, extract_features options).
+    Older files are a bare column list, trained with exact centralities.
+    """
+    if isinstance(spec, list):
+        return spec, {}
+    settings = spec.get("centrality", {})
+    options = {
+        "centrality": settings.get("mode", "exact"),
+        "epsilon": settings.get("epsilon", 0.1),
+        "seed": settings.get("seed", 0),
+    }
+    return spec["columns"], options
 
 def get_labels(G, source, target):
     """
     Generates labels. A node is 'critical' (1) if it's in the
     minimum node cut separating source and target.
     """
-    # Min-cut is a good proxy for "critical"
+    # Min-cut is a good proxy for "critical". The labels stay on
+    # networkx's cut, which rf_model.pkl was trained on: when several
+    # minimum cuts exist, minimum_vertex_cut picks the one closest to the
+    # source, a different cut in most generated games. Switching would
+    # need a retrain, and training graphs are small enough that the
+    # faster solver gains nothing here.
     try:
         cut_set = nx.minimum_node_cut(G, source, target)
     except nx.NetworkXError:
-        cut_set = set()
-        
+        cut_set = set()  # Adjacent endpoints have no vertex cut
+
+    import pandas as pd  # Labels are only built for training
     labels = {node: (1 if node in cut_set else 0) for node in G.nodes()}
-    return pd.Series(labels, name="is_critical")
\ No newline at end of file
+    return pd.Series(labels, name="is_critical")
@@ -0,0 +1,200 @@
+import numpy as np
+
+from core.graph.csr import as_csr
+from core.graph.traversal import bfs_distances
+from core.infection.frontier import firewall_mask
+from ml.features.extraction import node_features
+from ml.features.paths import nodes_on_any_path
+
+# Columns that depend on where the firewalls are. The centralities are
+# kept from the unfirewalled graph.
+DYNAMIC_COLUMNS = ("is_on_any_path", "distance_from_source", "distance_to_target")
+
+
+def remove_from_distances(graph, dist, blocked, node):
+    """
+    Updates `dist` in place after `node` (already set in `blocked`) is
+    removed. Only the nodes whose every shortest path ran through `node`
+    are re-distanced; the rest of the map is left as it is.
+    """
+    level = dist[node]
+    dist[node] = -1
+    if level < 0:
+        return
+
+    # 1. Walk down the BFS levels below `node`, collecting the nodes that
+    # lost their last parent one level up.
+    affected = np.zeros(graph.num_nodes, dtype=bool)
+    affected[node] = True
+    frontier = np.array([node], dtype=np.int64)
+    while len(frontier):
+        level += 1
+        _, neighbors = graph.expand(frontier)
+        candidates = np.unique(neighbors[dist[neighbors] == level])
+        owner, parents = graph.expand(candidates)
+        supported = (dist[parents] == level - 1) & ~affected[parents] & ~blocked[parents]
+        keep = np.bincount(owner[supported], minlength=len(candidates)) > 0
+        frontier = candidates[~keep]
+        affected[frontier] = True
+    affected[node] = False
+
+    lost = np.flatnonzero(affected)
+    if not len(lost):
+        return
+
+    # 2. Re-distance them from the unaffected nodes around them, in
+    # increasing order of distance.
+    dist[lost] = -1
+    unreached = np.iinfo(np.int64).max
+    tentative = np.full(graph.num_nodes, unreached, dtype=np.int64)
+    owner, neighbors = graph.expand(lost)
+    outside = (dist[neighbors] >= 0) & ~affected[neighbors]
+    np.minimum.at(tentative, lost[owner[outside]], dist[neighbors[outside]] + 1)
+
+    pending = affected
+    while True:
+        depth = tentative[pending].min(initial=unreached)
+        if depth == unreached:
+            break  # The rest is cut off from the root
+        frontier = np.flatnonzero(pending & (tentative == depth))
+        dist[frontier] = depth
+        pending[frontier] = False
+        _, neighbors = graph.expand(frontier)
+        neighbors = neighbors[pending[neighbors]]
+        tentative[neighbors] = np.minimum(tentative[neighbors], depth + 1)
+
+
+def restore_in_distances(graph, dist, blocked, node, root):
+    """
+    Updates `dist` in place after `node` (already cleared in `blocked`)
+    is added back: distances can only shrink, spreading out from it.
+    """
+    if node == root:
+        dist[:] = bfs_distances(graph, root, blocked)
+        return
+
+    neighbors = graph.neighbors(node)
+    reached = dist[neighbors][dist[neighbors] >= 0]
+    if not len(reached):
+        return
+    depth = reached.min() + 1
+    dist[node] = depth
+
+    frontier = np.array([node], dtype=np.int64)
+    while len(frontier):
+        _, neighbors = graph.expand(frontier)
+        closer = ~blocked[neighbors] & ((dist[neighbors] < 0) | (dist[neighbors] > depth + 1))
+        frontier = np.unique(neighbors[closer])
+        depth += 1
+        dist[frontier] = depth
+
+
+class IncrementalAnalysis:
+    """
+    Features and reachability for one game that follow the firewalls as
+    they are toggled one at a time.
+
+    Degree, betweenness and closeness come from node_features on the
+    unfirewalled graph and are never recomputed. The distance maps are
+    repaired locally around the toggled node, and path membership is
+    only recomputed when the toggle can actually change it. Firewalled
+    nodes count as removed: distance -1 and not on any path.
+    """
+
+    def __init__(self, graph, source, target, firewalled_nodes=(), base_features=None):
+        self.graph = as_csr(graph)
+        self.source = source
+        self.target = target
+        self.start = self.graph.index[source]
+        self.goal = self.graph.index[target]
+
+        if base_features is None:
+            base_features = node_features(self.graph, source, target)
+        self._base = base_features
+        self._rows = self.graph.positions(base_features.nodes)
+
+        self.blocked = firewall_mask(self.graph, firewalled_nodes)
+        self.dist_from_source = bfs_distances(self.graph, self.start, self.blocked)
+        self.dist_to_target = bfs_distances(self.graph, self.goal, self.blocked)
+        self.on_path = np.zeros(self.graph.num_nodes, dtype=bool)
+        if self.blocked.any():
+            self._recompute_paths()
+        else:
+            self.on_path[self._rows] = base_features.column("is_on_any_path") == 1
+
+    @property
+    def firewalled_nodes(self):
+        return self.graph.node_ids[self.blocked].tolist()
+
+    def _recompute_paths(self):
+        G = self.graph.to_networkx()
+        open_nodes = self.graph.node_ids[~self.blocked].tolist()
+        self.on_path[:] = False
+        self.on_path[self.graph.positions(
+            nodes_on_any_path(G.subgraph(open_nodes), self.source, self.target)
+        )] = True
+
+    def block(self, node):
+        """Places a firewall on `node`."""
+        position = self.graph.index[node]
+        if self.blocked[position]:
+            return
+        self.blocked[position] = True
+        target_was_reachable = self.dist_from_source[self.goal] >= 0
+        for dist in (self.dist_from_source, self.dist_to_target):
+            remove_from_distances(self.graph, dist, self.blocked, position)
+
+        # Removing a node that is on no simple s-t path leaves every such
+        # path intact
+        if self.on_path[position] or (target_was_reachable and position in (self.start, self.goal)):
+            self._recompute_paths()
+
+    def unblock(self, node):
+        """Removes the firewall from `node`."""
+        position = self.graph.index[node]
+        if not self.blocked[position]:
+            return
+        self.blocked[position] = False
+        target_was_reachable = self.dist_from_source[self.goal] >= 0
+        restore_in_distances(self.graph, self.dist_from_source, self.blocked, position, self.start)
+        restore_in_distances(self.graph, self.dist_to_target, self.blocked, position, self.goal)
+
+        # A node with at most one open neighbor joined to the source can
+        # only start a dead end, unless it reconnects the target
+        neighbors = self.graph.neighbors(position)
+        joined = np.count_nonzero(self.dist_from_source[neighbors] >= 0)
+        target_reachable = self.dist_from_source[self.goal] >= 0
+        if target_reachable and (joined > 1 or not target_was_reachable):
+            self._recompute_paths()
+
+    def toggle(self, node):
+        if self.blocked[self.graph.index[node]]:
+            self.unblock(node)
+        else:
+            self.block(node)
+
+    def set_firewalls(self, firewalled_nodes):
+        """Moves to a new firewall set, one toggle per changed node."""
+        wanted = set(firewalled_nodes) & set(self.graph.index)
+        current = set(self.firewalled_nodes)
+        for node in current - wanted:
+            self.unblock(node)
+        for node in wanted - current:
+            self.block(node)
+
+    def target_status(self):
+        """Same "target_status" run_bfs_simulation reports for these firewalls."""
+        reached = self.dist_from_source[self.goal] >= 0
+        return "INFECTED" if reached and not self.blocked[self.goal] else "SAFE"
+
+    def infected_count(self):
+        """Nodes the infection reaches, not counting firewalls it touches."""
+        return int(np.count_nonzero(self.dist_from_source >= 0))
+
+    def features(self):
+        """The node_features, updated for the current firewalls."""
+        return self._base.replace(
+            is_on_any_path=self.on_path[self._rows].astype(np.int64),
+            distance_from_source=self.dist_from_source[self._rows],
+            distance_to_target=self.dist_to_target[self._rows],
+        )
@@ -0,0 +1,115 @@
+import os
+
+import numpy as np
+
+# Arrays making up an exported forest, one .npy file each
+FOREST_ARRAYS = ("feature", "threshold", "left", "right", "value", "roots")
+
+# Rows traversed at once, bounding the (rows x trees) node matrix
+MAX_BATCH_ROWS = 8192
+
+
+def export_forest(model, path):
+    """
+    Flattens a fitted RandomForestClassifier into plain NumPy arrays.
+
+    Every tree's nodes are concatenated into one table; `roots` holds the
+    position of each tree's root. Leaves point back to themselves, so a
+    fixed number of steps walks every sample to its leaf. `value` is the
+    per-node probability of the positive class, as the tree would predict.
+    Each array is saved as its own .npy file in the directory `path`, so
+    it can be memory-mapped and shared between forked workers.
+    """
+    positive = list(model.classes_).index(1)
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        nodes = np.arange(tree.node_count)
+        leaf = tree.children_left == -1
+
+        proba = tree.value[:, 0, :]
+        proba = proba / proba.sum(axis=1, keepdims=True)
+
+        features.append(np.where(leaf, 0, tree.feature))
+        thresholds.append(tree.threshold)
+        lefts.append(np.where(leaf, nodes, tree.children_left) + offset)
+        rights.append(np.where(leaf, nodes, tree.children_right) + offset)
+        values.append(proba[:, positive])
+        roots.append(offset)
+        offset += tree.node_count
+        max_depth = max(max_depth, tree.max_depth)
+
+    os.makedirs(path, exist_ok=True)
+    arrays = {
+        "feature": np.concatenate(features).astype(np.int32),
+        "threshold": np.concatenate(thresholds).astype(np.float64),
+        "left": np.concatenate(lefts).astype(np.int32),
+        "right": np.concatenate(rights).astype(np.int32),
+        "value": np.concatenate(values).astype(np.float64),
+        # The last entry carries the depth every sample is walked for
+        "roots": np.array(roots + [max_depth], dtype=np.int32),
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f"{name}.npy"), array)
+
+
+class FlatForest:
+    """
+    Random forest inference over arrays written by export_forest. Needs
+    only NumPy, and with mmap=True the arrays stay in the page cache
+    instead of being copied into every worker.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = np.asarray(roots[:-1], dtype=np.int64)
+        self.max_depth = int(roots[-1])
+
+    @classmethod
+    def load(cls, path, mmap=False):
+        mmap_mode = "r" if mmap else None
+        return cls(*(
+            np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+            for name in FOREST_ARRAYS
+        ))
+
+    def predict_proba(self, X):
+        """
+        Same (n, 2) class probabilities as the sklearn model. Like sklearn,
+        inputs are compared as float32 against the float64 thresholds.
+        """
+        X = np.asarray(X, dtype=np.float32)
+        positive = np.empty(len(X), dtype=np.float64)
+
+        for start in range(0, len(X), MAX_BATCH_ROWS):
+            rows = X[start:start + MAX_BATCH_ROWS]
+            row_index = np.arange(len(rows))[:, None]
+            node = np.broadcast_to(self.roots, (len(rows), len(self.roots)))
+            # All trees advance one level per step; finished ones stay put
+            for _ in range(self.max_depth):
+                go_left = rows[row_index, self.feature[node]] <= self.threshold[node]
+                node = np.where(go_left, self.left[node], self.right[node])
+            positive[start:start + len(rows)] = self.value[node].mean(axis=1)
+
+        return np.stack([1 - positive, positive], axis=1)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import joblib
+
+    parser = argparse.ArgumentParser(description="Export a trained model for NumPy-only inference.")
+    parser.add_argument("--model", default="ml/models/rf_model.pkl")
+    parser.add_argument("--output", default="ml/models/rf_model_forest")
+    args = parser.parse_args()
+
+    export_forest(joblib.load(args.model), args.output)
+    print(f"Forest exported to {args.output}")
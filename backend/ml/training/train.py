@@ -1,6 +1,10 @@
 import pandas as pd
 import networkx as nx
+import numpy as np
 import joblib
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import classification_report
@@ -12,23 +16,25 @@ script_dir = os.path.dirname(__file__)
 backend_dir = os.path.abspath(os.path.join(script_dir, '..', '..'))
 sys.path.append(backend_dir)
 
+from core.graph.csr import CSRGraph
 from core.graph.generation import generate_graph
-from ml.features.extraction import extract_features, get_labels
+from ml.features.extraction import CENTRALITY_MODES, extract_features, feature_spec, get_labels
+from ml.inference.forest import export_forest
 
-def generate_training_data(num_graphs=200):
+def _generate_chunk(chunk_index, num_graphs, seed, feature_options=None):
     """
-    Generates a large dataset by creating many graphs.
+    Builds features and labels for one chunk of graphs. Each chunk has its
+    own seeded RNG, so the data only depends on the base seed and the
+    chunk layout, never on how many workers ran it. `feature_options` are
+    passed to extract_features.
     """
+    rng = random.Random(seed)
     all_features = []
     all_labels = []
-    
-    print(f"Generating {num_graphs} graphs for training data...")
-    for i in range(num_graphs):
-        if (i+1) % 20 == 0:
-            print(f"  ...graph {i+1}/{num_graphs}")
-            
-        game_data = generate_graph()
-        G = nx.node_link_graph(game_data['graph'], edges="links")
+
+    for _ in range(num_graphs):
+        game_data = generate_graph(seed=rng)
+        G = CSRGraph.from_node_link(game_data['graph']).to_networkx()
         source = game_data['source']
         target = game_data['target']
         
@@ -36,25 +42,154 @@ def generate_training_data(num_graphs=200):
         if not nx.has_path(G, source, target):
             continue
             
-        features = extract_features(G, source, target)
+        features = extract_features(G, source, target, **(feature_options or {}))
         labels = get_labels(G, source, target)
         
         all_features.append(features)
         all_labels.append(labels)
-        
+
+    return chunk_index, pd.concat(all_features), pd.concat(all_labels)
+
+
+def _write_chunk(chunk_index, num_graphs, seed, shard_dir, shard_format, feature_options=None):
+    """Generates one chunk and writes it straight to a shard file."""
+    _, X, y = _generate_chunk(chunk_index, num_graphs, seed, feature_options)
+    path = os.path.join(shard_dir, f"shard_{chunk_index:05d}.{shard_format}")
+    if shard_format == "parquet":
+        # Needs pyarrow or fastparquet installed
+        X.assign(is_critical=y.values).to_parquet(path)
+    else:
+        np.savez(path, X=X.to_numpy(), y=y.to_numpy(), columns=np.array(list(X.columns), dtype=str))
+    return chunk_index, path, len(X)
+
+
+def _run_chunks(task, num_graphs, workers, seed, chunk_size, extra_args=()):
+    """
+    Splits num_graphs into chunks with independent child seeds and runs
+    `task` over them, in-process or on a process pool. Yields results in
+    completion order while printing progress and throughput.
+    """
+    sizes = [min(chunk_size, num_graphs - start) for start in range(0, num_graphs, chunk_size)]
+    seeds = [
+        int(child.generate_state(1)[0])
+        for child in np.random.SeedSequence(seed).spawn(len(sizes))
+    ]
+    jobs = [(i, size, seeds[i]) + tuple(extra_args) for i, size in enumerate(sizes)]
+
+    print(f"Generating {num_graphs} graphs in {len(jobs)} chunks on {workers} worker(s)...")
+    started = time.perf_counter()
+    done = 0
+
+    def report(size):
+        nonlocal done
+        done += size
+        elapsed = time.perf_counter() - started
+        print(f"  ...graph {done}/{num_graphs} ({done / elapsed:.1f} graphs/s)")
+
+    if workers <= 1:
+        for job in jobs:
+            result = task(*job)
+            report(job[1])
+            yield result
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(task, *job): job[1] for job in jobs}
+        for future in as_completed(futures):
+            result = future.result()
+            report(futures[future])
+            yield result
+
+
+def generate_training_data(num_graphs=200, workers=1, seed=None, chunk_size=50,
+                           feature_options=None):
+    """
+    Generates a large dataset by creating many graphs.
+    With workers > 1 the graphs are built on a process pool.
+    """
+    chunks = {}
+    results = _run_chunks(
+        _generate_chunk, num_graphs, workers, seed, chunk_size,
+        extra_args=(feature_options,)
+    )
+    for chunk_index, X, y in results:
+        chunks[chunk_index] = (X, y)
+
     print("Data generation complete.")
     
-    # Combine all data
-    X = pd.concat(all_features)
-    y = pd.concat(all_labels)
+    # Combine all data, in chunk order so the result is reproducible
+    X = pd.concat([chunks[i][0] for i in sorted(chunks)])
+    y = pd.concat([chunks[i][1] for i in sorted(chunks)])
     
     return X, y
 
-def train_model():
+
+def write_training_shards(num_graphs, shard_dir, workers=1, seed=None,
+                          chunk_size=500, shard_format="npz", feature_options=None):
+    """
+    Like generate_training_data, but every chunk is written to its own
+    shard file as soon as it is done, so memory stays bounded by one chunk
+    per worker however many graphs are generated. Returns the shard paths.
+    """
+    if shard_format not in ("npz", "parquet"):
+        raise ValueError(f"Unknown shard format: {shard_format}")
+    os.makedirs(shard_dir, exist_ok=True)
+
+    paths = {}
+    rows = 0
+    results = _run_chunks(
+        _write_chunk, num_graphs, workers, seed, chunk_size,
+        extra_args=(shard_dir, shard_format, feature_options)
+    )
+    for chunk_index, path, num_rows in results:
+        paths[chunk_index] = path
+        rows += num_rows
+
+    print(f"Wrote {rows} rows to {len(paths)} shards in {shard_dir}")
+    return [paths[i] for i in sorted(paths)]
+
+
+def load_shards(paths):
+    """Reads shards written by write_training_shards back into (X, y)."""
+    all_features = []
+    all_labels = []
+    for path in paths:
+        if path.endswith(".parquet"):
+            df = pd.read_parquet(path)
+            all_labels.append(df.pop("is_critical"))
+            all_features.append(df)
+        else:
+            with np.load(path, allow_pickle=False) as shard:
+                all_features.append(pd.DataFrame(shard["X"], columns=shard["columns"].tolist()))
+                all_labels.append(pd.Series(shard["y"], name="is_critical"))
+    return (
+        pd.concat(all_features, ignore_index=True),
+        pd.concat(all_labels, ignore_index=True),
+    )
+
+def train_model(num_graphs=500, workers=1, seed=None, shard_dir=None,
+                shard_format="npz", chunk_size=None, centrality="exact", epsilon=0.1):
     """
     Trains a Random Forest model and saves it.
+    With shard_dir set, training data is streamed to shards first and
+    then read back, instead of being built up in memory.
+    `centrality` and `epsilon` choose how extract_features computes
+    betweenness and closeness; they are saved with the feature columns
+    so the API extracts features the same way.
     """
-    X, y = generate_training_data(num_graphs=500) # Use 500 graphs
+    feature_options = {"centrality": centrality, "epsilon": epsilon}
+    if shard_dir:
+        paths = write_training_shards(
+            num_graphs, shard_dir, workers=workers, seed=seed,
+            chunk_size=chunk_size or 500, shard_format=shard_format,
+            feature_options=feature_options
+        )
+        X, y = load_shards(paths)
+    else:
+        X, y = generate_training_data(
+            num_graphs=num_graphs, workers=workers, seed=seed,
+            chunk_size=chunk_size or 50, feature_options=feature_options
+        )
     
     # Define feature columns (important for prediction)
     feature_cols = list(X.columns)
@@ -77,16 +212,45 @@ def train_model():
     features_path = "ml/models/feature_columns.json"
     
     joblib.dump(model, model_path)
+    # NumPy-only copy for MODEL_FORMAT=forest serving
+    export_forest(model, "ml/models/rf_model_forest")
     import json
     with open(features_path, 'w') as f:
-        json.dump(feature_cols, f)
+        json.dump(feature_spec(feature_cols, **feature_options), f)
         
     print(f"Model saved to {model_path}")
     print(f"Features saved to {features_path}")
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Train the critical-node model.")
+    parser.add_argument("--num-graphs", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes used to generate training data")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Base seed; the same seed reproduces the same data")
+    parser.add_argument("--chunk-size", type=int, default=None,
+                        help="Graphs per chunk/shard")
+    parser.add_argument("--shard-dir", default=None,
+                        help="Write training data to shards here as it is generated")
+    parser.add_argument("--shard-format", choices=["npz", "parquet"], default="npz")
+    parser.add_argument("--centrality", choices=CENTRALITY_MODES, default="exact",
+                        help="How betweenness/closeness are computed")
+    parser.add_argument("--epsilon", type=float, default=0.1,
+                        help="Error bound that sets the pivot count of the sampled modes")
+    args = parser.parse_args()
+
     # Create models directory if it doesn't exist
-    import os
     os.makedirs("ml/models", exist_ok=True)
     
-    train_model()
\ No newline at end of file
+    train_model(
+        num_graphs=args.num_graphs,
+        workers=args.workers,
+        seed=args.seed,
+        shard_dir=args.shard_dir,
+        shard_format=args.shard_format,
+        chunk_size=args.chunk_size,
+        centrality=args.centrality,
+        epsilon=args.epsilon,
+    )
\ No newline at end of file
@@ -0,0 +1,81 @@
+import random
+
+import networkx as nx
+import pytest
+
+from core.graph.csr import CSRGraph
+from core.infection.cascade import run_cascade_simulation
+
+
+def random_game(seed):
+    rng = random.Random(seed)
+    num_nodes = rng.randint(3, 40)
+    G = nx.gnp_random_graph(num_nodes, rng.uniform(0.03, 0.2), seed=seed)
+    sources = rng.sample(range(num_nodes), rng.randint(1, 3))
+    targets = rng.sample(range(num_nodes), rng.randint(0, 3))
+    firewalls = rng.sample(range(num_nodes), rng.randint(0, num_nodes // 4))
+    return G, sources, targets, firewalls
+
+
+def reachable(G, sources, firewalls, max_steps=None):
+    """Every node a certain (p=1) cascade reaches: multi-source BFS."""
+    open_graph = G.subgraph(set(G) - set(firewalls))
+    reached = set()
+    for source in set(sources) - set(firewalls):
+        depths = nx.single_source_shortest_path_length(open_graph, source, cutoff=max_steps)
+        reached.update(depths)
+    return reached
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_certain_spread_is_bfs(seed):
+    G, sources, targets, firewalls = random_game(seed)
+    result = run_cascade_simulation(
+        CSRGraph.from_networkx(G), sources, targets, firewalls, probability=1.0, runs=7
+    )
+    reached = reachable(G, sources, firewalls)
+    assert result["node_probabilities"] == {node: 1.0 for node in reached}
+    assert result["target_probabilities"] == {t: float(t in reached) for t in targets}
+    assert result["any_target_probability"] == float(bool(reached & set(targets)))
+    assert result["mean_infected"] == len(reached)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_max_steps_limits_waves(seed):
+    G, sources, targets, firewalls = random_game(seed)
+    result = run_cascade_simulation(
+        CSRGraph.from_networkx(G), sources, targets, firewalls,
+        probability=1.0, runs=3, max_steps=2,
+    )
+    assert set(result["node_probabilities"]) == reachable(G, sources, firewalls, max_steps=2)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_no_spread_infects_only_sources(seed):
+    G, sources, targets, firewalls = random_game(seed)
+    result = run_cascade_simulation(
+        CSRGraph.from_networkx(G), sources, targets, firewalls, probability=0.0, runs=5
+    )
+    open_sources = set(sources) - set(firewalls)
+    assert result["node_probabilities"] == {node: 1.0 for node in open_sources}
+    assert result["mean_infected"] == len(open_sources)
+
+
+def test_edge_overrides_open_and_close_edges():
+    graph = CSRGraph.from_networkx(nx.path_graph(4))
+    result = run_cascade_simulation(
+        graph, [0], [3], probability=0.0, edge_probabilities=[(0, 1, 1.0), (2, 1, 1.0)], runs=5
+    )
+    assert set(result["node_probabilities"]) == {0, 1, 2}
+    assert result["any_target_probability"] == 0.0
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_duplicate_sources_change_nothing(seed):
+    G, sources, targets, firewalls = random_game(seed)
+    graph = CSRGraph.from_networkx(G)
+    once = run_cascade_simulation(graph, sources, targets, firewalls, probability=0.3, runs=200)
+    repeated = run_cascade_simulation(
+        graph, sources * 3 + sources[:1], targets, firewalls, probability=0.3, runs=200
+    )
+    assert repeated == once
@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+# Jobs run in-process, so the test needs no worker start-up
+os.environ.setdefault("EXECUTOR_KIND", "thread")
+
+from fastapi.testclient import TestClient
+
+from api.main import app
+from core.graph.csr import CSRGraph, GraphFormatError, compact_payload
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def path_graph(encoding):
+    # 0 - 1 - 2 - 3
+    return compact_payload([0, 1, 2, 3], [0, 1, 2], [1, 2, 3], encoding)
+
+
+MALFORMED = [
+    {"format": "edges", "num_nodes": 4, "edges": [[0, 1], [1, 9]]},
+    {"format": "edges", "num_nodes": 4, "edges": [[0, 1], [1]]},
+    {"format": "edges", "num_nodes": 4},
+    {"format": "edges_b64", "num_nodes": 4, "edges": "!!"},
+    {"format": "edges_b64", "num_nodes": 4, "edges": "AAAA"},
+    {"format": "edges", "num_nodes": 4, "nodes": [0, 1], "edges": []},
+    {"format": "edges", "num_nodes": 2, "nodes": ["a", "b"], "edges": [[0, 1]]},
+    {"format": "edges", "num_nodes": 2, "nodes": [[0], [1]], "edges": [[0, 1]]},
+    {"format": "edges", "num_nodes": 2, "nodes": [[0, 1], [2]], "edges": [[0, 1]]},
+    {"format": "edges", "num_nodes": 3, "nodes": [0, 0, 1], "edges": [[0, 1]]},
+    {"format": "adjacency", "num_nodes": 4, "edges": []},
+]
+
+
+@pytest.mark.parametrize("graph", MALFORMED)
+def test_from_compact_rejects_malformed(graph):
+    with pytest.raises(GraphFormatError):
+        CSRGraph.from_compact(graph)
+
+
+@pytest.mark.parametrize("encoding", ["edges", "edges_b64"])
+def test_simulate_accepts_compact(client, encoding):
+    response = client.post("/game/simulate", json={
+        "graph": path_graph(encoding), "source": 0, "target": 3, "firewalled_nodes": [2],
+    })
+    assert response.status_code == 200
+    assert response.json()["simulation"]["target_status"] == "SAFE"
+
+
+@pytest.mark.parametrize("url", [
+    "/game/simulate", "/game/simulate/stream", "/game/optimal_defense", "/ml/predict",
+])
+@pytest.mark.parametrize("graph", MALFORMED)
+def test_routes_reject_malformed(client, url, graph):
+    response = client.post(url, json={
+        "graph": graph, "source": 0, "target": 3, "firewalled_nodes": [],
+    })
+    assert response.status_code == 400
+    assert response.json()["detail"]
+
+
+def test_stream_rejects_unknown_source(client):
+    response = client.post("/game/simulate/stream", json={
+        "graph": path_graph("edges"), "source": 42, "target": 3, "firewalled_nodes": [],
+    })
+    assert response.headers["content-type"].startswith("application/json")
+    assert response.json() == {"error": "Source is not in the graph"}
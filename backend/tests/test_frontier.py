@@ -0,0 +1,87 @@
+import random
+from collections import deque
+
+import networkx as nx
+import pytest
+
+from core.graph.csr import CSRGraph
+from core.infection.frontier import (
+    evaluate_firewall_sets,
+    firewall_mask,
+    frontier_bfs,
+    pairwise_placements,
+    placement_count,
+    single_node_placements,
+)
+
+
+def deque_reach(G, source, target, firewalls):
+    """Per-set deque BFS, as /what_if ran before batching."""
+    if source in firewalls:
+        return {"target_status": "SAFE", "infected_count": 1}
+    seen = {source}
+    queue = deque([source])
+    while queue:
+        for neighbor in G.adj[queue.popleft()]:
+            if neighbor not in seen:
+                seen.add(neighbor)
+                if neighbor not in firewalls:
+                    queue.append(neighbor)
+    infected = target in seen and target not in firewalls
+    return {
+        "target_status": "INFECTED" if infected else "SAFE",
+        "infected_count": sum(node not in firewalls for node in seen),
+    }
+
+
+def random_graph(seed, max_nodes=30):
+    rng = random.Random(seed)
+    num_nodes = rng.randint(2, max_nodes)
+    G = nx.gnp_random_graph(num_nodes, rng.uniform(0.05, 0.3), seed=seed)
+    return rng, G
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_frontier_bfs_levels(seed):
+    rng, G = random_graph(seed)
+    graph = CSRGraph.from_networkx(G)
+    firewalls = rng.sample(list(G), rng.randint(0, len(G) // 3))
+    source = rng.choice([node for node in G if node not in firewalls] or [0])
+    if source in firewalls:
+        return
+
+    waves, touched = frontier_bfs(graph, graph.index[source], firewall_mask(graph, firewalls))
+    open_graph = G.subgraph(set(G) - set(firewalls))
+    distances = nx.single_source_shortest_path_length(open_graph, source)
+    assert [sorted(graph.node_ids[wave].tolist()) for wave in waves] == [
+        sorted(node for node, depth in distances.items() if depth == level)
+        for level in range(len(waves))
+    ]
+    assert sorted(graph.node_ids[touched].tolist()) == sorted(
+        node for node in firewalls if any(n in distances for n in G.adj[node])
+    )
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_evaluate_firewall_sets_matches_deque_bfs(seed):
+    rng, G = random_graph(seed)
+    graph = CSRGraph.from_networkx(G)
+    source, target = rng.sample(list(G), 2)
+    firewall_sets = [rng.sample(list(G), rng.randint(0, len(G) // 2)) for _ in range(20)]
+
+    results = evaluate_firewall_sets(graph, source, target, firewall_sets)
+    for nodes, result in zip(firewall_sets, results):
+        expected = deque_reach(G, source, target, set(nodes))
+        assert result["firewalled_nodes"] == nodes
+        assert result["target_status"] == expected["target_status"]
+        assert result["infected_count"] == expected["infected_count"]
+
+
+def test_placements_match_their_count():
+    G = nx.cycle_graph(7)
+    graph = CSRGraph.from_networkx(G)
+    single = single_node_placements(graph, 0, 3, base=[5])
+    pairwise = pairwise_placements(graph, 0, 3, base=[5])
+    assert len(single) == placement_count(graph, 0, 3, base=[5]) == 4
+    assert len(pairwise) == placement_count(graph, 0, 3, base=[5], pairwise=True) == 6
+    assert all(placement[0] == 5 and not {0, 3} & set(placement) for placement in pairwise)
@@ -0,0 +1,59 @@
+import random
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from core.graph.csr import CSRGraph
+from core.graph.traversal import bfs_distances
+from core.infection.frontier import firewall_mask
+from core.infection.simulation import run_bfs_simulation
+from ml.features.incremental import IncrementalAnalysis
+from ml.features.paths import nodes_on_any_path
+
+
+def assert_matches_full_recompute(analysis, G):
+    graph = analysis.graph
+    blocked = firewall_mask(graph, analysis.firewalled_nodes)
+    assert (analysis.blocked == blocked).all()
+    assert (analysis.dist_from_source == bfs_distances(graph, analysis.start, blocked)).all()
+    assert (analysis.dist_to_target == bfs_distances(graph, analysis.goal, blocked)).all()
+
+    open_nodes = set(G) - set(analysis.firewalled_nodes)
+    on_path = nodes_on_any_path(G.subgraph(open_nodes), analysis.source, analysis.target)
+    assert set(graph.node_ids[analysis.on_path].tolist()) == on_path
+
+    simulation = run_bfs_simulation(graph, analysis.source, analysis.target, analysis.firewalled_nodes)
+    assert analysis.target_status() == simulation["target_status"]
+
+
+@pytest.mark.parametrize("seed", range(60))
+def test_random_toggles_match_full_recompute(seed):
+    rng = random.Random(seed)
+    num_nodes = rng.randint(3, 35)
+    G = nx.gnp_random_graph(num_nodes, rng.uniform(0.05, 0.3), seed=seed)
+    source, target = rng.sample(range(num_nodes), 2)
+    initial = rng.sample(range(num_nodes), rng.randint(0, num_nodes // 4))
+
+    analysis = IncrementalAnalysis(CSRGraph.from_networkx(G), source, target, initial)
+    assert_matches_full_recompute(analysis, G)
+    # Toggles favour a few nodes, so the same node is often placed and
+    # removed again; source and target are toggled too
+    hot = rng.sample(range(num_nodes), min(num_nodes, 6)) + [source, target]
+    for _ in range(40):
+        node = rng.choice(hot) if rng.random() < 0.6 else rng.randrange(num_nodes)
+        analysis.toggle(node)
+        assert_matches_full_recompute(analysis, G)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_set_firewalls_matches_a_fresh_analysis(seed):
+    rng = random.Random(seed)
+    G = nx.connected_watts_strogatz_graph(30, 4, 0.3, seed=seed)
+    graph = CSRGraph.from_networkx(G)
+    analysis = IncrementalAnalysis(graph, 0, 15)
+    for _ in range(5):
+        firewalls = rng.sample(range(1, 30), rng.randint(0, 8))
+        analysis.set_firewalls(firewalls)
+        fresh = IncrementalAnalysis(graph, 0, 15, firewalls)
+        assert np.array_equal(analysis.features().values, fresh.features().values)
@@ -0,0 +1,51 @@
+import random
+
+import networkx as nx
+import pytest
+
+from core.graph.csr import CSRGraph
+from core.graph.mincut import minimum_vertex_cut
+
+
+def separates(G, cut, source, target):
+    remaining = G.subgraph(set(G) - set(cut))
+    return not nx.has_path(remaining, source, target)
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_matches_networkx_cut_size(seed):
+    rng = random.Random(seed)
+    num_nodes = rng.randint(2, 40)
+    G = nx.gnp_random_graph(num_nodes, rng.uniform(0.05, 0.4), seed=seed)
+    # Sparse, shuffled ids check the id <-> position mapping
+    G = nx.relabel_nodes(G, dict(zip(range(num_nodes), rng.sample(range(1000), num_nodes))))
+    source, target = rng.sample(list(G), 2)
+
+    cut = minimum_vertex_cut(CSRGraph.from_networkx(G), source, target)
+    if G.has_edge(source, target):
+        assert cut is None
+    elif not nx.has_path(G, source, target):
+        assert cut == []
+    else:
+        assert len(cut) == len(nx.minimum_node_cut(G, source, target))
+        assert source not in cut and target not in cut
+        assert separates(G, cut, source, target)
+
+
+def test_degenerate_cases():
+    G = nx.path_graph(5)
+    G.add_node(9)
+    assert minimum_vertex_cut(G, 0, 1) is None
+    assert minimum_vertex_cut(G, 2, 2) is None
+    assert minimum_vertex_cut(G, 0, 9) == []
+    assert minimum_vertex_cut(G, 0, 4) == [1]
+
+
+def test_accepts_node_link():
+    G = nx.cycle_graph(6)
+    graph_data = {
+        "nodes": [{"id": node} for node in G],
+        "links": [{"source": u, "target": v} for u, v in G.edges()],
+    }
+    cut = minimum_vertex_cut(graph_data, 0, 3)
+    assert len(cut) == 2 and separates(G, cut, 0, 3)
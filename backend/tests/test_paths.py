@@ -0,0 +1,36 @@
+import random
+
+import networkx as nx
+import pytest
+
+from ml.features.paths import nodes_on_any_path
+
+
+def brute_force_on_any_path(G, source, target):
+    """The all_simple_paths scan nodes_on_any_path replaced."""
+    if source == target or source not in G or target not in G:
+        return set()
+    nodes = set()
+    for path in nx.all_simple_paths(G, source, target):
+        nodes.update(path)
+    nodes.discard(source)
+    nodes.discard(target)
+    return nodes
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_matches_simple_path_enumeration(seed):
+    rng = random.Random(seed)
+    num_nodes = rng.randint(2, 11)
+    G = nx.gnp_random_graph(num_nodes, rng.uniform(0.1, 0.5), seed=seed)
+    source, target = rng.sample(range(num_nodes), 2)
+    assert nodes_on_any_path(G, source, target) == brute_force_on_any_path(G, source, target)
+
+
+def test_degenerate_endpoints():
+    G = nx.path_graph(4)
+    G.add_node(9)
+    assert nodes_on_any_path(G, 0, 0) == set()
+    assert nodes_on_any_path(G, 0, 42) == set()
+    assert nodes_on_any_path(G, 0, 9) == set()
+    assert nodes_on_any_path(G, 0, 3) == {1, 2}
@@ -0,0 +1,40 @@
+import networkx as nx
+import pytest
+
+from api.routes.game import simulate_job
+from core.graph.csr import CSRGraph
+
+
+def two_cut_graph():
+    # 0 - {1, 2} - 3 - {4, 5} - 6: {1, 2}, {3} and {4, 5} all separate
+    # 0 from 6, and {3} is the only minimum cut
+    G = nx.Graph([(0, 1), (0, 2), (1, 3), (2, 3), (3, 4), (3, 5), (4, 6), (5, 6)])
+    return CSRGraph.from_networkx(G)
+
+
+def two_paths():
+    # 0 - 1 - 2 - 3 and 0 - 4 - 5 - 3: one node from each path makes a
+    # minimum cut, so there are four of them
+    return CSRGraph.from_networkx(nx.Graph([(0, 1), (1, 2), (2, 3), (0, 4), (4, 5), (5, 3)]))
+
+
+@pytest.mark.parametrize("picks", [[1, 4], [2, 5], [1, 5], [5, 2]])
+def test_every_minimum_cut_gets_the_full_bonus(picks):
+    scoring = simulate_job(two_paths(), 0, 3, picks)["scoring"]
+    assert scoring["score"] == 10000 - 1000 + 2000
+
+
+def test_bonus_scales_with_extra_firewalls():
+    best = simulate_job(two_cut_graph(), 0, 6, [3])["scoring"]["score"]
+    wider = simulate_job(two_cut_graph(), 0, 6, [4, 5])["scoring"]["score"]
+    assert best == 10000 - 500 + 2000
+    assert wider == 10000 - 1000 + 1000
+
+
+def test_endpoint_firewalls_earn_no_bonus():
+    scoring = simulate_job(two_cut_graph(), 0, 6, [6])["scoring"]
+    assert scoring["score"] == 10000 - 500
+
+
+def test_infected_target_scores_zero():
+    assert simulate_job(two_cut_graph(), 0, 6, [1])["scoring"]["score"] == 0
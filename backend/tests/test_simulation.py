@@ -0,0 +1,89 @@
+import random
+from collections import deque
+
+import networkx as nx
+import pytest
+
+from core.graph.csr import CSRGraph
+from core.infection.simulation import run_bfs_simulation, stream_bfs_simulation
+
+
+def node_link(G):
+    return {
+        "nodes": [{"id": node} for node in G.nodes()],
+        "links": [{"source": u, "target": v} for u, v in G.edges()],
+    }
+
+
+def deque_bfs_simulation(G, source, target, firewalled_nodes):
+    """The networkx deque BFS that run_bfs_simulation replaced."""
+    if source in firewalled_nodes:
+        return {
+            "status": "STOPPED_AT_SOURCE",
+            "infection_order": [source],
+            "infected_nodes": [source],
+            "target_status": "SAFE",
+        }
+    queue = deque([source])
+    infected = {source}
+    infection_order = [source]
+    target_status = "SAFE"
+    while queue:
+        current = queue.popleft()
+        if current == target:
+            target_status = "INFECTED"
+        for neighbor in G.adj[current]:
+            if neighbor not in infected:
+                infected.add(neighbor)
+                if neighbor not in firewalled_nodes:
+                    infection_order.append(neighbor)
+                    queue.append(neighbor)
+    return {
+        "status": "COMPLETED",
+        "infection_order": infection_order,
+        "infected_nodes": list(infected),
+        "target_status": target_status,
+    }
+
+
+def random_game(seed):
+    rng = random.Random(seed)
+    num_nodes = rng.randint(2, 40)
+    G = nx.gnp_random_graph(num_nodes, rng.uniform(0.02, 0.3), seed=seed)
+    source, target = rng.sample(range(num_nodes), 2)
+    firewalls = rng.sample(range(num_nodes), rng.randint(0, num_nodes // 3))
+    return G, source, target, firewalls
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_matches_deque_bfs(seed):
+    G, source, target, firewalls = random_game(seed)
+    expected = deque_bfs_simulation(G, source, target, firewalls)
+    result = run_bfs_simulation(CSRGraph.from_node_link(node_link(G)), source, target, firewalls)
+
+    assert result["status"] == expected["status"]
+    assert result["target_status"] == expected["target_status"]
+    assert result["infection_order"] == expected["infection_order"]
+    assert sorted(result["infected_nodes"]) == sorted(expected["infected_nodes"])
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_stream_matches_simulation(seed):
+    G, source, target, firewalls = random_game(seed)
+    graph = CSRGraph.from_networkx(G)
+    expected = run_bfs_simulation(graph, source, target, firewalls)
+    messages = list(stream_bfs_simulation(graph, source, target, firewalls))
+
+    done = messages[-1]
+    infected = [node for message in messages[:-1] for node in message["infected"]]
+    touched = [node for message in messages[:-1] for node in message["touched_firewalls"]]
+    assert done["target_status"] == expected["target_status"]
+    assert infected == expected["infection_order"]
+    assert done["infected_count"] == len(expected["infected_nodes"])
+    assert sorted(infected + touched) == sorted(expected["infected_nodes"])
+
+
+def test_stream_rejects_unknown_source_before_streaming():
+    graph = CSRGraph.from_networkx(nx.path_graph(3))
+    with pytest.raises(KeyError):
+        stream_bfs_simulation(graph, 42, 2, [])
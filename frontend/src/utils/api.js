@@ -31,6 +31,21 @@ export const getMlSuggestion = (graph, source, target, k = 5) => {
   });
 };
 
+// ✅ Session mode: the server keeps the graph, so only picks are sent back
+export const getNewSessionGame = () => {
+  return api.post("/game/new_game", null, { params: { session: true } });
+};
+
+export const runSessionSimulation = (gameId, firewalled_nodes) => {
+  return api.post(`/game/sessions/${gameId}/simulate`, {
+    firewalled_nodes,
+  });
+};
+
+export const getSessionMlSuggestion = (gameId, k = 5) => {
+  return api.post(`/ml/sessions/${gameId}/predict`, { k });
+};
+
 // ✅ Optional: helper for backend health check
 export const pingServer = async () => {
   try {